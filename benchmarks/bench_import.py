@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+#
+# Benchmark of start up cost: import time, construction of Parkrun and
+# Country, and the latency of the first report (against the local stand-in
+# server, see standin.py, so no network is needed).
+#
+# Each run is a fresh interpreter, as nothing is imported yet in a real CLI
+# or worker start. Also lists which heavy modules each step pulls in.
+#
+# Usage: python benchmarks/bench_import.py --repeats 5
+#
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REFACTOR_DIR   = os.path.join(BENCHMARKS_DIR, '..', 'refactor')
+
+HEAVY_MODULES = ['pandas', 'numpy', 'bs4', 'lxml', 'requests', 'urllib3']
+
+#
+# Run in a fresh interpreter; prints one JSON line of timings
+#
+SCRIPT = textwrap.dedent('''
+    import json, sys, time
+    sys.path[:0] = [{benchmarks!r}, {refactor!r}]
+
+    def heavy():
+        return [name for name in {heavy!r} if name in sys.modules]
+
+    timings = {{}}
+    start   = time.perf_counter()
+    import parkrun, country
+    timings['import']       = time.perf_counter() - start
+    timings['import_loads'] = heavy()
+
+    start = time.perf_counter()
+    pk    = parkrun.Parkrun()
+    au    = country.Country('Australia')
+    timings['construct']       = time.perf_counter() - start
+    timings['construct_loads'] = heavy()
+
+    # Only needed for the first report, and not timed
+    import standin
+    server = standin.StandinServer(rows={rows}).start()
+    server.install()
+
+    start = time.perf_counter()
+    pk.get_largest_clubs()
+    timings['first_report'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pk.get_largest_clubs()
+    timings['second_report'] = time.perf_counter() - start
+
+    server.shutdown()
+    print(json.dumps(timings))
+''')
+
+
+def run(rows: int) -> dict:
+    script = SCRIPT.format(benchmarks=BENCHMARKS_DIR, refactor=REFACTOR_DIR,
+                           heavy=HEAVY_MODULES, rows=rows)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark import time and first-call latency.')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=100)
+    args = parser.parse_args()
+
+    runs = [run(args.rows) for _ in range(args.repeats)]
+
+    for stage in ('import', 'construct', 'first_report', 'second_report'):
+        times = sorted(result[stage] for result in runs)
+        print(f'{stage:<14} best = {times[0] * 1000:>8.1f}ms median = {times[len(times) // 2] * 1000:>8.1f}ms')
+
+    print(f'modules loaded by import    : {runs[0]["import_loads"]}')
+    print(f'modules loaded by construct : {runs[0]["construct_loads"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'refactor'))
+
+import normalize
+
+#
+# Benchmarks the normalisation steps in normalize.py against the per-row
+# implementations they replaced in transform.py.
+#
+# Usage: python benchmarks/bench_normalize.py [rows]
+#
+
+ROWS    = 100_000
+REPEATS = 5
+
+AGE_GROUPS = ['SM25-29', 'SW30-34', 'VM40-44', 'VW55-59', 'JM10', 'JW11-14', 'VM70-74', '']
+
+
+def legacy_assign_milestone(no_runs):
+    if no_runs >= 25 and no_runs < 50:
+        return 25
+    elif no_runs >= 50 and no_runs < 100:
+        return 50
+    elif no_runs >= 100 and no_runs < 250:
+        return 100
+    elif no_runs >= 250 and no_runs < 500:
+        return 250
+    elif no_runs >= 500 and no_runs < 1000:
+        return 500
+    else:
+        return
+
+
+def legacy_age_groups(age_groups):
+    age_range = age_groups.str.extract(r'(\d+-\d+|\d+)')
+    gender    = age_groups.str.extract(r'([A-Z]{2})').apply(lambda x: x.str[-1])
+    gender    = gender.replace('', 'Unknown')
+    gender    = np.where(gender == 'M', 'Male', 'Female')
+    return age_range, gender
+
+
+def best_of(stmt) -> float:
+    return min(timeit.repeat(stmt, number=1, repeat=REPEATS))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    rng  = np.random.default_rng(0)
+
+    total_runs = pd.Series(rng.integers(1, 1500, rows))
+    age_groups = pd.Series(rng.choice(AGE_GROUPS, rows))
+    clubs      = pd.Series(rng.choice(['Unattached', 'Albert Park Runners', ''], rows))
+
+    # Make sure the vectorized milestones match the legacy ones
+    pd.testing.assert_series_equal(total_runs.apply(legacy_assign_milestone),
+                                   normalize.assign_milestones(total_runs),
+                                   check_dtype=False, check_categorical=False)
+
+    cases = [
+        ('milestones',
+         lambda: total_runs.apply(legacy_assign_milestone),
+         lambda: normalize.assign_milestones(total_runs)),
+        ('age groups',
+         lambda: legacy_age_groups(age_groups),
+         lambda: normalize.parse_age_groups(age_groups)),
+        ('clubs',
+         lambda: clubs.str.replace('Unattached', ''),
+         lambda: normalize.clean_clubs(clubs)),
+    ]
+
+    print(f'{"step":<12} {"legacy (s)":>12} {"vectorized (s)":>15} {"speedup":>9}   rows = {rows}')
+    for name, legacy, vectorized in cases:
+        before = best_of(legacy)
+        after  = best_of(vectorized)
+        print(f'{name:<12} {before:>12.4f} {after:>15.4f} {before / after:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
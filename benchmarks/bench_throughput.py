@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'refactor'))
+
+import scrape
+import sweep
+from   client import FetchClient, set_client, get_client
+from   parkrun import Parkrun
+from   standin import StandinServer
+
+#
+# End-to-end throughput benchmark of the fetch paths against the local
+# stand-in server (see standin.py), with no network needed.
+#
+# Times, for the global reports:
+#   - sequential : each Parkrun get_* method in turn
+#   - fetch_all  : Parkrun.fetch_all(), concurrently
+# and, for every country in the stand-in's countries page:
+#   - sweep      : sweep.sweep() of --sweep-reports, rate limited per domain
+#   - pipeline   : the same sweep, parsed in --parse-workers processes
+#
+# Usage: python benchmarks/bench_throughput.py --latency 0.2 --error-rate 0.05
+#
+
+SWEEP_REPORTS = 'course_records,largest_clubs'
+
+
+def timed(label: str, function, server: StandinServer) -> None:
+    server.counts.clear()
+    start   = time.perf_counter()
+    result  = function()
+    elapsed = time.perf_counter() - start
+
+    requests = sum(server.counts.values())
+    errors   = len(getattr(result, 'errors', {}))
+    print(f'{label:<12} {elapsed:>8.2f}s {requests:>6} requests {requests / elapsed:>8.1f} req/s '
+          f'responses = {dict(sorted(server.counts.items()))} failed reports = {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fetch throughput against a local stand-in.')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=5.0, help='requests per second to each domain')
+    parser.add_argument('--sweep-reports', default=SWEEP_REPORTS)
+    parser.add_argument('--parser', default='lxml')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    scrape.set_parser(args.parser)
+
+    # Retry 503s quickly, so the benchmark measures throughput rather than sleeps
+    set_client(FetchClient(backoff_factor=0.05, backoff_max=1.0))
+
+    server = StandinServer(rows=args.rows, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate).start()
+    server.install()
+    print(f'Stand-in on {server.url}: rows = {args.rows}, latency = {args.latency}s '
+          f'(+{args.jitter}s), error rate = {args.error_rate}')
+
+    pk = Parkrun()
+
+    def sequential():
+        for name in Parkrun.REPORTS:
+            getattr(pk, f'get_{name}')()
+
+    timed('sequential', sequential, server)
+    timed('fetch_all', lambda: pk.fetch_all(max_workers=args.workers), server)
+    timed('sweep', lambda: sweep.sweep(args.sweep_reports.split(','), rate=args.rate,
+                                       max_workers=args.workers), server)
+    timed('pipeline', lambda: sweep.sweep(args.sweep_reports.split(','), rate=args.rate,
+                                          max_workers=args.workers,
+                                          parse_workers=args.parse_workers), server)
+
+    get_client().close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
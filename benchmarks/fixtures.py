@@ -0,0 +1,207 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'refactor'))
+
+from parkrun import Parkrun
+
+#
+# This module generates pages which imitate the parkrun pages read by
+# Parkrun and Country, for benchmarking without the network.
+#
+# Each report has a function which returns the cells for one row of its
+# table, in the same layout as the real page (athlete links, spacer cells,
+# etc). page() wraps any number of rows in the surrounding markup, so pages
+# can be made at any size, and the stored fixtures in benchmarks/fixtures/
+# are small pages written by write_fixtures().
+#
+# Usage: python benchmarks/fixtures.py    (rewrites the stored fixtures)
+#
+
+FIXTURES_DIR  = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURE_ROWS  = 50
+
+EVENTS     = ['Albert', 'Bushy', 'Cannon Hill', 'Darebin Parklands', 'Eltham', 'Frankston',
+              'Gungahlin', 'Hobart', 'Inverell', 'Jells', 'Kirkwall', 'Lillie']
+CLUBS      = ['Unattached', 'Albert Park Runners', 'Bushy Harriers', 'Coburg Harriers', '']
+NAMES      = ['Jo BLOGGS', 'Sam SMITH', 'Alex JONES', 'Kim LEE', 'Chris BROWN', 'Pat TAYLOR']
+AGE_GROUPS = ['SM25-29', 'SW30-34', 'VM40-44', 'VW55-59', 'JM10', 'JW11-14', 'VM70-74']
+
+COUNTRIES = {
+    'Australia'      : 'https://www.parkrun.com.au',
+    'Canada'         : 'https://www.parkrun.ca',
+    'Denmark'        : 'https://www.parkrun.dk',
+    'Germany'        : 'https://www.parkrun.com.de',
+    'Ireland'        : 'https://www.parkrun.ie',
+    'Japan'          : 'https://www.parkrun.jp',
+    'New Zealand'    : 'https://www.parkrun.co.nz',
+    'South Africa'   : 'https://www.parkrun.co.za',
+    'United Kingdom' : 'https://www.parkrun.org.uk',
+    'USA'            : 'https://www.parkrun.us',
+}
+
+
+def event(rng):
+    name = rng.choice(EVENTS)
+    slug = name.lower().replace(' ', '')
+    return f'<td><a href="/{slug}/results/">{name}</a></td>'
+
+
+def athlete(rng):
+    id = rng.randint(1, 9_999_999)
+    if rng.random() < 0.5:
+        href = f'https://www.parkrun.com.au/parkrunner/{id}'
+    else:
+        href = f'/results/athleteresultshistory/?athleteNumber={id}'
+    return f'<td><a href="{href}">{rng.choice(NAMES)}</a></td>'
+
+
+def time(rng, low=900, high=1800):
+    seconds = rng.randint(low, high)
+    return f'<td>{seconds // 60:02d}:{seconds % 60:02d}</td>'
+
+
+def date(rng):
+    return f'<td>{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2005, 2024)}</td>'
+
+
+def text(value):
+    return f'<td>{value}</td>'
+
+
+SPACER = '<td class="bspacer"></td>'
+
+#
+# Row generators for global reports, by report (names as in Parkrun.REPORTS)
+#
+ROWS = {
+    'first_finishers'      : lambda rng: [event(rng), athlete(rng), text(rng.choice(CLUBS)), SPACER,
+                                          athlete(rng), text(rng.choice(CLUBS))],
+    'sub_seventeen_runners': lambda rng: [event(rng), athlete(rng), time(rng, 840, 1019),
+                                          text(rng.choice(CLUBS))],
+    'top_age_grade'        : lambda rng: [event(rng), athlete(rng), time(rng), text(rng.choice(AGE_GROUPS)),
+                                          text(f'{rng.uniform(70, 100):.2f} %'), text(rng.choice(CLUBS))],
+    'new_category_records' : lambda rng: [event(rng), athlete(rng), time(rng), text(rng.choice(AGE_GROUPS)),
+                                          text(f'{rng.uniform(70, 100):.2f} %'), text(rng.choice(CLUBS))],
+    'course_records'       : lambda rng: [event(rng), athlete(rng), time(rng, 900, 1100), date(rng), SPACER,
+                                          athlete(rng), time(rng, 800, 1000), date(rng)],
+    'freedom_finishers'    : lambda rng: [athlete(rng), date(rng), text(rng.choice(EVENTS)), time(rng)],
+    'attendance_records'   : lambda rng: [event(rng), text(rng.randint(100, 2000)), date(rng),
+                                          text('New record' if rng.random() < 0.05 else rng.randint(50, 1500))],
+    'most_events_attended' : lambda rng: [athlete(rng), text(''), text(rng.randint(50, 500)),
+                                          text(rng.randint(100, 1200))],
+    'most_first_finishes'  : lambda rng: [athlete(rng), text(rng.randint(1, 600))],
+    'largest_clubs'        : lambda rng: [text(rng.choice(CLUBS[1:])), text(rng.randint(10, 5000)),
+                                          text(rng.randint(100, 200000)), '<td><a href="/">links</a></td>'],
+}
+
+
+#
+# Row generators for reports only available for a country (see registry.py),
+# which run.py doesn't benchmark
+#
+COUNTRY_ROWS = {
+    'not_parkrunners'      : lambda rng: [event(rng), text(rng.randint(1, 300)), text(rng.randint(1, 3000)),
+                                          time(rng)],
+}
+
+
+def not_parkrun_countries(rng) -> list:
+    '''
+    Returns the rows of the country section which follows the locations on
+    the (not)parkrun page, starting with Australia (see
+    transform.NOT_PARKRUN_COUNTRIES_MARKER), with a one cell heading after it.
+
+    '''
+    rows = [f'<tr><td><a href="{url}/results/notparkrun/">{name}</a></td>'
+            f'{text(rng.randint(100, 9000))}{text(rng.randint(100, 90000))}{time(rng)}</tr>'
+            for name, url in COUNTRIES.items()]
+    return rows[:1] + ['<tr><td>Other countries</td></tr>'] + rows[1:]
+
+
+#
+# Rows which follow the generated rows, by report
+#
+TRAILERS = {
+    'not_parkrunners' : not_parkrun_countries,
+}
+
+
+#
+# Row generators for pages of a single location, by the last part of their
+# url, e.g. https://www.parkrun.com.au/albertmelbourne/results/latestresults/
+#
+EVENT_ROWS = {
+    'latestresults' : lambda rng: [text(rng.randint(1, 500)), athlete(rng), text(rng.choice(['Male', 'Female'])),
+                                   text(rng.choice(AGE_GROUPS)), text(rng.choice(CLUBS)), time(rng)],
+    'eventhistory'  : lambda rng: [text(rng.randint(1, 800)), date(rng), text(rng.randint(50, 900)),
+                                   text(rng.randint(5, 60)), athlete(rng), athlete(rng)],
+    'clublist'      : lambda rng: [text(rng.choice(CLUBS[1:])), text(rng.randint(1, 500))],
+    'fastest500'    : lambda rng: [text(rng.randint(1, 500)), athlete(rng), time(rng, 840, 1200)],
+}
+
+
+def page(report: str, rows: int, seed: int = 0) -> str:
+    '''
+    Returns a results page for report (from ROWS, COUNTRY_ROWS or
+    EVENT_ROWS) with the given number of rows.
+
+    '''
+    rng  = random.Random(seed)
+    cell = {**ROWS, **COUNTRY_ROWS, **EVENT_ROWS}[report]
+    body = [f'<tr>{"".join(cell(rng))}</tr>' for _ in range(rows)]
+    body = '\n'.join(body + TRAILERS.get(report, lambda rng: [])(rng))
+    return '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>results | parkrun</title></head>\n'\
+           '<body><div class="results"><h1>Results</h1>\n'\
+           '<table class="results sortable">\n<thead><tr><th>Results</th></tr></thead>\n'\
+           f'<tbody>\n{body}\n</tbody>\n</table></div></body></html>\n'
+
+
+def profile_page(id: int) -> str:
+    '''
+    Returns an athlete's profile page, the same for the same athlete.
+
+    '''
+    rng = random.Random(id)
+    return '<!DOCTYPE html>\n<html><body><div id="content">\n'\
+           f'<h2>{rng.choice(NAMES)} <span style="font-weight: normal" title="parkrun ID">(A{id})</span></h2>\n'\
+           f'<h3>{rng.randint(1, 800)} parkruns total</h3>\n'\
+           f'<p>Most recent age category was {rng.choice(AGE_GROUPS)}</p>\n'\
+           '</div></body></html>\n'
+
+
+def countries_page(countries: dict = COUNTRIES) -> str:
+    sections = '\n'.join(
+        f'<div class="section-wrap"><h2>{name}</h2><p>parkrun {name}</p>'
+        f'<a href="{url}">{url}</a></div>'
+        for name, url in countries.items())
+    return f'<!DOCTYPE html>\n<html><body>\n{sections}\n</body></html>\n'
+
+
+def urls() -> dict:
+    '''
+    Returns the global url of each report, by report name.
+
+    '''
+    return {name: url for name, (url, _) in Parkrun.REPORTS.items()}
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, f'{name}.html')) as f:
+        return f.read()
+
+
+def write_fixtures(rows: int = FIXTURE_ROWS) -> None:
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+
+    pages = {report: page(report, rows) for report in ROWS}
+    pages['countries'] = countries_page()
+
+    for name, html in pages.items():
+        with open(os.path.join(FIXTURES_DIR, f'{name}.html'), 'w') as f:
+            f.write(html)
+
+
+if __name__ == '__main__':
+    write_fixtures()
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'refactor'))
+
+import cache
+import scrape
+import fixtures
+from   parkrun import Parkrun
+
+#
+# Benchmarks parsing, transforming and end-to-end reports without the
+# network, using pages from benchmarks/fixtures.py.
+#
+# Pages are served from an offline response cache, so the timings cover
+# everything after the download: reading the cache, parsing the table and
+# transforming it. For each report the following are timed:
+#
+#   - parse/<parser> : scrape.parse_html_table on the page's html
+#   - read_html      : scrape.get_html_tables (pandas.read_html)
+#   - transform      : the report's transform.* function
+#   - report         : the Parkrun get_* method, from construction
+#
+# The stored fixtures are used as they are, and generated pages are used for
+# each of --rows (e.g. 1000 up to 1000000).
+#
+# Usage:
+#   python benchmarks/run.py --rows 1000,10000 --save baseline.json
+#   python benchmarks/run.py --rows 1000,10000 --baseline baseline.json --threshold 1.25
+#
+# With --baseline, the exit code is 1 if any case is slower than threshold
+# times its baseline.
+#
+
+ROWS      = [1000, 10000]
+REPEATS   = 3
+THRESHOLD = 1.25
+PARSERS   = list(scrape.PARSERS)
+
+# pandas.read_html is very slow on large pages, so it's only timed up to here
+READ_HTML_MAX_ROWS = 10000
+
+
+def to_response(url: str, html: str) -> requests.Response:
+    response             = requests.Response()
+    response._content    = html.encode('utf-8')
+    response.status_code = 200
+    response.url         = url
+    response.encoding    = 'utf-8'
+    return response
+
+
+def seed(response_cache: cache.ResponseCache, pages: dict) -> None:
+    '''
+    Stores pages (url to html) in the cache, replacing any already there.
+
+    '''
+    response_cache.clear()
+    for url, html in pages.items():
+        response_cache.put(url, to_response(url, html))
+
+
+def best_of(function, repeats: int) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeats))
+
+
+def bench_page(report: str, html: str, label: str, repeats: int, response_cache) -> dict:
+    url = fixtures.urls()[report]
+    seed(response_cache, {url: html, scrape.COUNTRIES_URL: fixtures.read_fixture('countries')})
+
+    _, function = Parkrun.REPORTS[report]
+    method      = getattr(Parkrun, f'get_{report}')
+
+    results = {}
+    for parser in PARSERS:
+        results[f'parse/{parser}/{report}/{label}'] = \
+            best_of(lambda: scrape.parse_html_table(html, parser), repeats)
+
+    if label == 'fixture' or int(label) <= READ_HTML_MAX_ROWS:
+        results[f'read_html/{report}/{label}'] = \
+            best_of(lambda: scrape.get_html_tables(url), repeats)
+
+    results[f'transform/{report}/{label}'] = best_of(lambda: function(url), repeats)
+
+    def report_from_scratch():
+        # Start from an empty country registry, as a new process would
+        scrape.get_country_registry().refresh()
+        method(Parkrun())
+
+    results[f'report/{report}/{label}'] = best_of(report_from_scratch, repeats)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    '''
+    Returns the cases which are slower than threshold times their baseline.
+
+    '''
+    return [(case, baseline[case], seconds)
+            for case, seconds in results.items()
+            if case in baseline and seconds > baseline[case] * threshold]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parse and transform paths offline.')
+    parser.add_argument('--rows', default=','.join(map(str, ROWS)),
+                        help='comma separated page sizes to generate, e.g. 1000,10000,1000000')
+    parser.add_argument('--reports', default=','.join(fixtures.ROWS),
+                        help='comma separated reports to benchmark')
+    parser.add_argument('--parser', default=None, help='parser used by the transforms (bs4 or lxml)')
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--baseline', help='json file of results to compare against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='slowdown (as a ratio) treated as a regression')
+    args = parser.parse_args()
+
+    if args.parser:
+        scrape.set_parser(args.parser)
+
+    rows    = [int(n) for n in args.rows.split(',') if n]
+    reports = [r for r in args.reports.split(',') if r]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        response_cache = cache.ResponseCache(os.path.join(directory, 'responses.sqlite'),
+                                             max_bytes=2 ** 40, offline=True)
+        cache.set_cache(response_cache)
+
+        for report in reports:
+            pages = [('fixture', fixtures.read_fixture(report))]
+            pages += [(str(n), fixtures.page(report, n)) for n in rows]
+
+            for label, html in pages:
+                for case, seconds in bench_page(report, html, label, args.repeats,
+                                                response_cache).items():
+                    results[case] = seconds
+                    print(f'{case:<55} {seconds:>10.4f}s', flush=True)
+
+        cache.set_cache(None)
+        response_cache.close()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.threshold)
+        for case, before, after in regressions:
+            print(f'REGRESSION: {case} {before:.4f}s -> {after:.4f}s ({after / before:.2f}x)')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.baseline} (threshold {args.threshold}x)')
+
+
+if __name__ == '__main__':
+    main()
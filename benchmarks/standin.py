@@ -0,0 +1,206 @@
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+from   http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'refactor'))
+
+import fixtures
+from   client import get_client
+
+#
+# A local stand-in for the parkrun sites, for load and concurrency testing
+# without the network.
+#
+# The first part of each path is the parkrun host being imitated, so
+# https://www.parkrun.com.au/results/mostevents/ is served at
+# http://127.0.0.1:<port>/www.parkrun.com.au/results/mostevents/. install()
+# sets up the shared client to send every https:// url to the server this
+# way, so Parkrun, Country, sweeps etc. work unchanged (and still rate limit
+# and cache by the real host). The server serves:
+#
+#   /<host>/countries/                 : countries page (see fixtures.COUNTRIES)
+#   /<host>/results/<report>/          : global or country report
+#   /<host>/<event>/results/<page>/    : location page, e.g. latestresults
+#   /<host>/<event>/results/<number>/  : results of a single event
+#   /<host>/parkrunner/<id>/           : athlete profile
+#
+# Pages are generated with fixtures.page(), with a configurable number of
+# rows, response latency, and proportion of 503 responses.
+#
+# Usage: python benchmarks/standin.py --port 8000 --latency 0.2 --error-rate 0.05
+#
+
+#
+# Report pages, by the last part of their url
+#
+REPORT_PATHS = {
+    'firstfinishers'     : 'first_finishers',
+    'sub17'              : 'sub_seventeen_runners',
+    'topagegrade'        : 'top_age_grade',
+    'newcatrecords'      : 'new_category_records',
+    'newcategoryrecords' : 'new_category_records',
+    'courserecords'      : 'course_records',
+    'freedom'            : 'freedom_finishers',
+    'attendancerecords'  : 'attendance_records',
+    'mostevents'         : 'most_events_attended',
+    'mostfirstfinishes'  : 'most_first_finishes',
+    'largestclubs'       : 'largest_clubs',
+    'notparkrun'         : 'not_parkrunners',
+}
+
+COUNTRIES_PATH = re.compile(r'^/[^/]+/countries/?$')
+REPORT_PATH    = re.compile(r'^/[^/]+/results/(?P<page>[^/]+)/?$')
+EVENT_PATH     = re.compile(r'^/[^/]+/(?P<event>[^/]+)/results/(?P<page>[^/]+)/?$')
+PROFILE_PATH   = re.compile(r'^/[^/]+/parkrunner/(?P<id>\d+)/?$')
+
+
+class StandinServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple = ('127.0.0.1', 0),
+                 rows: int          = fixtures.FIXTURE_ROWS,
+                 latency: float     = 0.0,
+                 jitter: float      = 0.0,
+                 error_rate: float  = 0.0,
+                 seed: int          = 0) -> None:
+        '''
+        rows       - number of rows in each table
+        latency    - seconds to wait before each response
+        jitter     - up to this many seconds are added to latency at random
+        error_rate - proportion of requests answered with a 503
+
+        '''
+        super().__init__(address, StandinHandler)
+        self.rows       = rows
+        self.latency    = latency
+        self.jitter     = jitter
+        self.error_rate = error_rate
+
+        self._rng   = random.Random(seed)
+        self._lock  = threading.Lock()
+        self._pages = {}
+
+        # Request counts, by status code
+        self.counts = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def page(self, path: str) -> bytes:
+        '''
+        Returns the page for a path, or None if there isn't one. Pages are
+        generated once and reused, so timings measure the client rather than
+        page generation.
+
+        '''
+        if match := PROFILE_PATH.match(path):
+            # Too many athletes to keep every profile
+            return fixtures.profile_page(int(match['id'])).encode('utf-8')
+
+        if COUNTRIES_PATH.match(path):
+            key = ('countries',)
+        elif match := REPORT_PATH.match(path):
+            if match['page'] not in REPORT_PATHS:
+                return None
+            key = (REPORT_PATHS[match['page']],)
+        elif match := EVENT_PATH.match(path):
+            page = match['page']
+            key  = ('latestresults',) if page.isdigit() else (page,)
+            if key[0] not in fixtures.EVENT_ROWS:
+                return None
+        else:
+            return None
+
+        with self._lock:
+            if key not in self._pages:
+                html = fixtures.countries_page() if key == ('countries',) \
+                       else fixtures.page(key[0], self.rows)
+                self._pages[key] = html.encode('utf-8')
+            return self._pages[key]
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + self._rng.uniform(0, self.jitter)
+
+    def fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def count(self, status: int) -> None:
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def start(self) -> 'StandinServer':
+        '''
+        Serves requests on a background thread.
+
+        '''
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def install(self, client=None) -> None:
+        '''
+        Sends every https:// url requested by the client (defaults to the
+        shared client) to this server.
+
+        '''
+        client = client or get_client()
+        client.rewrites['https://'] = f'{self.url}/'
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        server = self.server
+        time.sleep(server.delay())
+
+        if server.fail():
+            self.respond(503, b'Service unavailable')
+            return
+
+        page = server.page(self.path.split('?')[0])
+        if page is None:
+            self.respond(404, b'Not found')
+            return
+
+        self.respond(200, page)
+
+    def respond(self, status: int, body: bytes) -> None:
+        self.server.count(status)
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Keep benchmark output readable
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve parkrun-like pages locally.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--rows', type=int, default=fixtures.FIXTURE_ROWS)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StandinServer((args.host, args.port), args.rows, args.latency,
+                           args.jitter, args.error_rate)
+    print(f'Serving on {server.url}, e.g. {server.url}/www.parkrun.com/results/mostevents/')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+import datetime
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from   collections import namedtuple
+from   contextlib import contextmanager
+import bulk
+from   cache import CacheEntry
+from   files import atomic_write
+
+#
+# This module contains an archive of every page fetched, so that reports can
+# be rebuilt from past pages (e.g. after fixing a transform) without
+# rescraping, which is slow, rate limited, and can't recover last month's
+# page anyway.
+#
+# Unlike the response cache (cache.py), which keeps one entry per url and
+# evicts old ones, the archive keeps every fetch. Bodies are content
+# addressed: each distinct body is stored once, compressed, under
+#
+#   <root>/objects/<hash[:2]>/<sha256 of body>.<zst|gz>
+#
+# and a SQLite index records each fetch by url and time, so an unchanged
+# page fetched every week costs one index row a week. Bodies are compressed
+# with zstd if the zstandard package is installed, and gzip otherwise; the
+# codec is recorded per body, so an archive may hold both.
+#
+# Once an archive is set (see set_archive), every page scrape.get_response()
+# retrieves from the network is added to it. Within replay(), pages are
+# served from the archive instead, as they were at a given time, and
+# nothing is fetched, so any transform (or Parkrun, Country, sweep, ...)
+# runs over archived pages, e.g.
+#
+#   with archive.replay(pages, as_of='2026-09-01'):
+#       df = Parkrun().get_top_age_grade()
+#
+# or reprocess() reruns a transform over every archived version of a page.
+#
+
+DEFAULT_CODEC = 'zstd'
+GZIP_LEVEL    = 6
+ZSTD_LEVEL    = 10
+
+EXTENSIONS = {
+    'gzip' : 'gz',
+    'zstd' : 'zst',
+}
+
+ArchiveEntry = namedtuple('ArchiveEntry', ['url', 'fetched_at', 'content_hash', 'encoding',
+                                           'size', 'codec', 'path'])
+
+# Columns of an ArchiveEntry, from the fetches (f) and objects (o) tables
+ENTRY_COLUMNS = 'f.url, f.fetched_at, f.content_hash, f.encoding, o.size, o.codec, o.path'
+
+
+def _zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def available_codec(codec: str = DEFAULT_CODEC) -> str:
+    '''
+    Returns codec if it can be used, falling back to gzip when zstandard
+    isn't installed.
+
+    '''
+    if codec not in EXTENSIONS:
+        raise ValueError(f'Unknown codec = {codec}, expected one of {list(EXTENSIONS)}')
+    if codec == 'zstd' and _zstandard() is None:
+        return 'gzip'
+    return codec
+
+
+def compress(body: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, GZIP_LEVEL)
+
+
+def open_stream(path: str, codec: str):
+    '''
+    Returns a file object which decompresses the body at path as it's read.
+
+    '''
+    if codec == 'zstd':
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise ImportError(f'zstandard is needed to read {path}')
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return gzip.open(path, 'rb')
+
+
+def timestamp(value, end_of_day: bool = True) -> float:
+    '''
+    Converts a time (seconds since the epoch, datetime, date or ISO string)
+    to seconds since the epoch. A date on its own means the end of that day
+    (or the start, if not end_of_day).
+
+    '''
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value) if len(value) == 10 \
+                else datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.datetime):
+        time_of_day = datetime.time.max if end_of_day else datetime.time.min
+        value       = datetime.datetime.combine(value, time_of_day)
+    return value.timestamp()
+
+
+class Archive:
+
+    def __init__(self, root: str, codec: str = DEFAULT_CODEC) -> None:
+        '''
+        root  - directory of the archive
+        codec - compression for new bodies, 'zstd' (if installed) or 'gzip'
+
+        '''
+        self.root  = root
+        self.codec = available_codec(codec)
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+
+        # Pages are added from fetch threads, so guard the connection
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(os.path.join(root, 'index.sqlite'),
+                                     check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS objects (
+                content_hash TEXT PRIMARY KEY,
+                size         INTEGER NOT NULL,
+                stored_size  INTEGER NOT NULL,
+                codec        TEXT NOT NULL,
+                path         TEXT NOT NULL
+            )''')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS fetches (
+                url          TEXT NOT NULL,
+                fetched_at   REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                encoding     TEXT
+            )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS fetches_url ON fetches (url, fetched_at)')
+        self._db.commit()
+
+    def put(self, url: str, body: bytes, encoding: str = None, fetched_at: float = None) -> str:
+        '''
+        Records a fetch of url, storing body unless the same body is already
+        archived. Returns the content hash of body.
+
+        '''
+        digest = hashlib.sha256(body).hexdigest()
+
+        with self._lock:
+            stored = self._db.execute('SELECT 1 FROM objects WHERE content_hash = ?',
+                                      (digest,)).fetchone()
+        if stored is None:
+            self._write(digest, body)
+
+        with self._lock:
+            self._db.execute('INSERT INTO fetches VALUES (?, ?, ?, ?)',
+                             (url, time.time() if fetched_at is None else fetched_at,
+                              digest, encoding))
+            self._db.commit()
+        return digest
+
+    def entry(self, url: str, as_of=None) -> ArchiveEntry:
+        '''
+        Returns the latest fetch of url at or before as_of (any time if
+        None), or None if there isn't one.
+
+        '''
+        query  = 'WHERE f.url = ?'
+        params = [url]
+        if as_of is not None:
+            query += ' AND f.fetched_at <= ?'
+            params.append(timestamp(as_of))
+
+        with self._lock:
+            row = self._db.execute(f'SELECT {ENTRY_COLUMNS} FROM fetches f JOIN objects o '
+                                   f'USING (content_hash) {query} '
+                                   f'ORDER BY f.fetched_at DESC LIMIT 1', params).fetchone()
+        return None if row is None else ArchiveEntry(*row)
+
+    def history(self, url: str = None, start=None, end=None) -> list:
+        '''
+        Returns every fetch (optionally of one url, between start and end
+        inclusive), oldest first.
+
+        '''
+        conditions = []
+        params     = []
+        for column, operator, value in (('f.url', '=', url),
+                                        ('f.fetched_at', '>=', start),
+                                        ('f.fetched_at', '<=', end)):
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                params.append(value if column == 'f.url' else timestamp(value, operator == '<='))
+
+        query = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        with self._lock:
+            rows = self._db.execute(f'SELECT {ENTRY_COLUMNS} FROM fetches f JOIN objects o '
+                                    f'USING (content_hash) {query} ORDER BY f.fetched_at, f.rowid',
+                                    params).fetchall()
+        return [ArchiveEntry(*row) for row in rows]
+
+    def urls(self, pattern: str = None) -> list:
+        '''
+        Returns the urls archived (optionally only those containing pattern).
+
+        '''
+        query  = 'WHERE url LIKE ?' if pattern is not None else ''
+        params = [f'%{pattern}%'] if pattern is not None else []
+        with self._lock:
+            rows = self._db.execute(f'SELECT DISTINCT url FROM fetches {query} ORDER BY url',
+                                    params).fetchall()
+        return [url for url, in rows]
+
+    def open(self, entry: ArchiveEntry):
+        '''
+        Returns a file object streaming the (decompressed) body of an entry.
+
+        '''
+        return open_stream(os.path.join(self.root, entry.path), entry.codec)
+
+    def read(self, entry: ArchiveEntry) -> bytes:
+        with self.open(entry) as f:
+            return f.read()
+
+    def get(self, url: str, as_of=None) -> CacheEntry:
+        '''
+        Returns the page for url as it was at as_of (the latest if None), in
+        the form of a cache entry (see cache.to_response), or None if it
+        isn't archived.
+
+        '''
+        entry = self.entry(url, as_of)
+        if entry is None:
+            return None
+        return CacheEntry(url, self.read(entry), entry.fetched_at, None, None, entry.encoding)
+
+    def size(self) -> tuple:
+        '''
+        Returns the total size of the distinct bodies archived, and the size
+        they take up compressed, in bytes.
+
+        '''
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) '
+                                    'FROM objects').fetchone()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _write(self, digest: str, body: bytes) -> None:
+        path = os.path.join('objects', digest[:2], f'{digest}.{EXTENSIONS[self.codec]}')
+        data = compress(body, self.codec)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+
+        atomic_write(os.path.join(self.root, path), write)
+
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO objects VALUES (?, ?, ?, ?, ?)',
+                             (digest, len(body), len(data), self.codec, path))
+            self._db.commit()
+
+
+#
+# Process-wide archive. Nothing is archived until an archive is set. While
+# replaying, pages are served from the archive as of _as_of.
+#
+_archive   = None
+_replaying = False
+_as_of     = None
+
+
+def get_archive() -> Archive:
+    return _archive
+
+
+def set_archive(archive: Archive) -> None:
+    global _archive
+    _archive = archive
+
+
+def replaying() -> tuple:
+    '''
+    Returns whether pages are being replayed from the archive, and as of
+    when.
+
+    '''
+    return _replaying, _as_of
+
+
+@contextmanager
+def replay(archive: Archive, as_of=None):
+    '''
+    Serves every page from archive, as it was at as_of (the latest if None),
+    within the block, without touching the network. Pages which aren't
+    archived raise ArchiveMissError.
+
+    '''
+    global _archive, _replaying, _as_of
+    previous   = _archive, _replaying, _as_of
+    _archive   = archive
+    _replaying = True
+    _as_of     = as_of
+    try:
+        yield archive
+    finally:
+        _archive, _replaying, _as_of = previous
+
+
+def reprocess(archive: Archive, function, pattern: str = None, start=None, end=None,
+              typed: bool = False) -> bulk.BulkResult:
+    '''
+    Reruns a transform function (e.g. transform.get_top_age_grade) over
+    every archived fetch of urls containing pattern, fetched between start
+    and end. Returns a dictionary of (url, fetched_at) to DataFrame, with
+    failures in the errors attribute of the result.
+
+    '''
+    result = bulk.BulkResult()
+    for entry in archive.history(None, start, end):
+        if pattern is not None and pattern not in entry.url:
+            continue
+
+        key = (entry.url, entry.fetched_at)
+        with replay(archive, entry.fetched_at):
+            try:
+                result[key] = function(entry.url, typed)
+            except Exception as e:
+                result.errors[key] = e
+    return result
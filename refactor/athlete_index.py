@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+import schema
+
+#
+# This module combines every report returned by Parkrun or Country (e.g.
+# from fetch_all) into one index of athletes, keyed by integer Athlete ID,
+# so analyses across reports don't need ad-hoc merges of text frames, e.g.
+# (see sources/analyses.txt, Q5):
+#
+#   index = AthleteIndex(Parkrun().fetch_all())
+#   index.corr('Unique Events', 'First Place Finishes')
+#
+# For each athlete the index records which reports they appear in (as a
+# bitmask, one bit per report) and their key metrics, taking the best value
+# where a metric is in several reports. Columns are numpy or nullable
+# (masked) arrays, so each athlete takes a few dozen bytes, and queries work
+# on whole columns at once.
+#
+
+#
+# Metrics, with the report columns they come from and how values from
+# several reports (or rows) are combined
+#
+METRICS = {
+    'First Place Finishes' : (['No. First Place Finishes'],                     'max'),
+    'Unique Events'        : (['No. Unique Events (Global)',
+                               'No. Unique Events (in Home Country)'],           'max'),
+    'Total Runs'           : (['Total Runs Worldwide'],                         'max'),
+    'Best Time'            : (['Time'],                                         'min'),
+    'Best Age Grade'       : (['Age Grade'],                                    'max'),
+}
+
+METRIC_DTYPES = {
+    'First Place Finishes' : 'Int32',
+    'Unique Events'        : 'Int32',
+    'Total Runs'           : 'Int32',
+    'Best Time'            : 'Int32',
+    'Best Age Grade'       : 'Float32',
+}
+
+ATHLETE_ID = 'Athlete ID'
+REPORTS    = 'Reports'
+
+# Bits in the reports bitmask
+MAX_REPORTS = 64
+
+
+def athlete_ids(ids: pd.Series) -> np.ndarray:
+    '''
+    Converts Athlete IDs (text or numbers) to int64, with -1 where there
+    isn't an ID.
+
+    '''
+    ids = pd.to_numeric(pd.Series(ids).astype(object).replace('', None), errors='coerce')
+    return ids.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def metric_values(values: pd.Series, metric: str) -> np.ndarray:
+    '''
+    Converts a report column (text or typed) to float64 values of metric,
+    with NaN where there isn't a value. Times are in seconds.
+
+    '''
+    values = pd.Series(values)
+    if metric == 'Best Time':
+        if pd.api.types.is_timedelta64_dtype(values):
+            values = values.dt.total_seconds()
+        elif not pd.api.types.is_numeric_dtype(values):
+            values = pd.Series(schema.convert(values, 'seconds'))
+    elif metric == 'Best Age Grade':
+        values = pd.Series(schema.convert(values, 'percent'))
+    else:
+        values = pd.Series(schema.convert(values, 'int'))
+    return values.astype('Float64').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class AthleteIndex:
+
+    def __init__(self, reports: dict) -> None:
+        '''
+        reports - dictionary of report name to DataFrame, e.g. the result of
+                  Parkrun.fetch_all(). Reports without an Athlete ID column
+                  are left out.
+
+        '''
+        self.reports = [name for name, df in reports.items() if ATHLETE_ID in df.columns]
+        if len(self.reports) > MAX_REPORTS:
+            raise ValueError(f'At most {MAX_REPORTS} reports can be indexed, got {len(self.reports)}')
+
+        frames = []
+        for bit, name in enumerate(self.reports):
+            frames.append(self._metrics(reports[name], np.uint64(1) << np.uint64(bit)))
+
+        if frames:
+            combined = pd.concat(frames, ignore_index=True)
+        else:
+            combined = pd.DataFrame({ATHLETE_ID: np.array([], dtype=np.int64),
+                                     REPORTS: np.array([], dtype=np.uint64),
+                                     **{metric: [] for metric in METRICS}})
+
+        # Each report has one row per athlete here, so summing bits is the same as or-ing them
+        aggregations = {REPORTS: 'sum', **{metric: how for metric, (_, how) in METRICS.items()}}
+        table        = combined.groupby(ATHLETE_ID, sort=True).agg(aggregations)
+
+        self.ids     = table.index.to_numpy(dtype=np.int64)
+        self.bitmask = table[REPORTS].to_numpy(dtype=np.uint64)
+        self.metrics = pd.DataFrame({metric: table[metric].astype(METRIC_DTYPES[metric]).array
+                                     for metric in METRICS},
+                                    index=pd.Index(self.ids, name=ATHLETE_ID))
+
+    def _metrics(self, df: pd.DataFrame, bit: np.uint64) -> pd.DataFrame:
+        '''
+        Returns one row per athlete in a report, with its bit and the best
+        value of each metric in the report.
+
+        '''
+        ids  = athlete_ids(df[ATHLETE_ID])
+        keep = ids >= 0
+
+        values = {ATHLETE_ID: ids[keep]}
+        for metric, (columns, _) in METRICS.items():
+            column = next((column for column in columns if column in df.columns), None)
+            if column is None:
+                values[metric] = np.full(keep.sum(), np.nan)
+            else:
+                values[metric] = metric_values(df[column], metric)[keep]
+
+        aggregations = {metric: how for metric, (_, how) in METRICS.items()}
+        report       = pd.DataFrame(values).groupby(ATHLETE_ID, sort=False).agg(aggregations)
+        report.insert(0, REPORTS, bit)
+        return report.reset_index()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, athlete_id) -> bool:
+        return self.positions([athlete_id])[0] >= 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.bitmask.nbytes + int(self.metrics.memory_usage(index=False).sum())
+
+    def positions(self, ids) -> np.ndarray:
+        '''
+        Returns the position of each athlete ID in the index, or -1 for
+        athletes not in the index.
+
+        '''
+        ids = athlete_ids(ids)
+        if len(self.ids) == 0:
+            return np.full(len(ids), -1)
+
+        positions = np.searchsorted(self.ids, ids).clip(max=len(self.ids) - 1)
+        return np.where(self.ids[positions] == ids, positions, -1)
+
+    def bit(self, report: str) -> np.uint64:
+        if report not in self.reports:
+            raise KeyError(f'Report = {report} not indexed, expected one of {self.reports}')
+        return np.uint64(1) << np.uint64(self.reports.index(report))
+
+    def mask(self, *reports, all: bool = False) -> np.ndarray:
+        '''
+        Returns a boolean array over the index, True for athletes in any of
+        the reports (or in every one, with all=True).
+
+        '''
+        bits = np.uint64(0)
+        for report in reports:
+            bits |= self.bit(report)
+
+        if all:
+            return (self.bitmask & bits) == bits
+        return (self.bitmask & bits) != 0
+
+    def in_reports(self, *reports, all: bool = False) -> pd.DataFrame:
+        '''
+        Returns the table of athletes in any (or every) one of the reports.
+
+        '''
+        return self.table()[self.mask(*reports, all=all)]
+
+    def report_counts(self) -> pd.Series:
+        '''
+        Returns the number of reports each athlete is in.
+
+        '''
+        counts = np.zeros(len(self.ids), dtype=np.int8)
+        for bit in range(len(self.reports)):
+            counts += ((self.bitmask >> np.uint64(bit)) & np.uint64(1)).astype(np.int8)
+        return pd.Series(counts, index=self.metrics.index, name='No. Reports')
+
+    def reports_of(self, athlete_id) -> list:
+        '''
+        Returns the names of the reports an athlete is in.
+
+        '''
+        position = self.positions([athlete_id])[0]
+        if position < 0:
+            return []
+        bits = self.bitmask[position]
+        return [name for bit, name in enumerate(self.reports)
+                if bits & (np.uint64(1) << np.uint64(bit))]
+
+    def table(self) -> pd.DataFrame:
+        '''
+        Returns the metrics of every athlete, with the number of reports
+        each is in.
+
+        '''
+        df = self.metrics.copy()
+        df.insert(0, 'No. Reports', self.report_counts())
+        return df
+
+    def lookup(self, ids) -> pd.DataFrame:
+        '''
+        Returns the metrics of the given athletes, in the same order, with
+        <NA> for athletes not in the index.
+
+        '''
+        positions = self.positions(ids)
+        found     = positions >= 0
+        df        = self.metrics.iloc[np.where(found, positions, 0)].reset_index(drop=True)
+        df[~found] = pd.NA
+        df.index = pd.Index(athlete_ids(ids), name=ATHLETE_ID)
+        return df
+
+    def join(self, df: pd.DataFrame, metrics: list = None) -> pd.DataFrame:
+        '''
+        Returns a copy of a report with metrics of its athletes added as
+        columns (all metrics by default), matched on Athlete ID.
+
+        '''
+        metrics = list(METRICS) if metrics is None else metrics
+        values  = self.lookup(df[ATHLETE_ID])
+
+        joined = df.copy()
+        for metric in metrics:
+            joined[metric] = values[metric].array
+        return joined
+
+    def top(self, metric: str, n: int = 10, ascending: bool = None) -> pd.DataFrame:
+        '''
+        Returns the n best athletes by metric (smallest first for Best Time,
+        largest first otherwise).
+
+        '''
+        if ascending is None:
+            ascending = METRICS[metric][1] == 'min'
+        values = self.metrics[metric].dropna()
+        values = values.nsmallest(n) if ascending else values.nlargest(n)
+        return self.metrics.loc[values.index]
+
+    def corr(self, x: str, y: str, method: str = 'pearson') -> float:
+        '''
+        Returns the correlation between two metrics, over athletes with
+        both.
+
+        '''
+        both = self.metrics[[x, y]].dropna().astype(float)
+        return both[x].corr(both[y], method=method)
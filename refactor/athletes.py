@@ -0,0 +1,185 @@
+import re
+import threading
+import pandas as pd
+import bulk
+import normalize
+import schema
+from   scrape import get_response
+from   exceptions import ParseError
+
+#
+# This module retrieves athlete profiles, e.g.
+# https://www.parkrun.com.au/parkrunner/1114599/, for every athlete in a set
+# of reports, giving a compact table of athletes which the reports can be
+# joined to on 'Athlete ID'.
+#
+# The same athletes appear in many reports (first finishers, sub 17, most
+# events, most first finishes, ...), so IDs are deduplicated across every
+# report first, and profiles already retrieved are kept, so each athlete is
+# fetched at most once. Profiles are fetched concurrently (see bulk.py), and
+# read with precompiled patterns rather than by parsing the whole page.
+#
+# Usage:
+#
+#   pk       = Parkrun()
+#   reports  = pk.fetch_all()
+#   athletes = get_athletes(*reports.values())
+#   df       = reports['most_first_finishes'].merge(athletes.drop(columns='Athlete Name'),
+#                                                   on='Athlete ID', how='left')
+#
+
+PROFILE_URL = 'https://www.parkrun.com.au/parkrunner/{}/'
+
+# e.g. <h2>Jo BLOGGS <span>(A1114599)</span></h2>
+NAME_PATTERN       = re.compile(r'<h[23][^>]*>\s*([^<]*?)\s*<span[^>]*>\s*\(A?\d+\)')
+# e.g. Most recent age category was VM40-44
+AGE_GROUP_PATTERN  = re.compile(r'age category was\s+([A-Z]{2}[\d-]*)', re.IGNORECASE)
+# e.g. <h3>123 parkruns total</h3>
+TOTAL_RUNS_PATTERN = re.compile(r'(\d[\d,]*)\s+parkruns?\s+total', re.IGNORECASE)
+
+ATHLETE_COLS = ['Athlete ID', 'Athlete Name', 'Age Group', 'Gender', 'Age Range', 'Total Runs']
+
+# Columns of reports which hold athlete IDs
+ID_COLUMN_PATTERN = re.compile(r'(^Athlete| Finisher) ID$')
+
+
+def athlete_ids(*frames) -> list:
+    '''
+    Returns the distinct athlete IDs in any number of reports, from their
+    'Athlete ID' (or first finisher ID) columns, in order of appearance.
+
+    '''
+    ids = []
+    for df in frames:
+        for column in df.columns:
+            if ID_COLUMN_PATTERN.search(str(column)):
+                ids.append(df[column].astype(str))
+
+    if not ids:
+        return []
+    ids = pd.unique(pd.concat(ids, ignore_index=True))
+    return [id for id in ids if id not in ('', 'nan', 'None', '<NA>')]
+
+
+def parse_profile(html: str) -> dict:
+    '''
+    Returns the name, age group and total runs from an athlete's profile
+    page. Age group and total runs are None if not on the page.
+
+    '''
+    name = NAME_PATTERN.search(html)
+    if name is None:
+        raise ValueError('No athlete name found in profile')
+
+    age_group  = AGE_GROUP_PATTERN.search(html)
+    total_runs = TOTAL_RUNS_PATTERN.search(html)
+    return {
+        'Athlete Name' : name.group(1),
+        'Age Group'    : age_group.group(1) if age_group else None,
+        'Total Runs'   : total_runs.group(1).replace(',', '') if total_runs else None,
+    }
+
+
+def fetch_profile(url: str, typed: bool = False) -> dict:
+    '''
+    Retrieves and parses a single profile page. typed is unused, and is
+    only there to match the transform functions (see bulk.fetch_reports).
+
+    '''
+    response = get_response(url)
+    try:
+        return parse_profile(response.text)
+    except Exception as e:
+        raise ParseError(f'Unable to read athlete profile from url = {url}: {e}') from e
+
+
+class AthleteProfiles:
+    '''
+    Retrieves athlete profiles, keeping every profile retrieved so that each
+    athlete is only fetched once. Profiles which failed are in errors, as
+    athlete ID to exception, and are retried on the next call.
+
+    '''
+
+    def __init__(self, url: str = PROFILE_URL) -> None:
+        self.url    = url
+        self.errors = {}
+
+        self._lock     = threading.Lock()
+        self._profiles = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._profiles)
+
+    def fetch(self, ids, max_workers: int = bulk.MAX_WORKERS) -> None:
+        '''
+        Retrieves the profiles of athletes not already retrieved.
+
+        '''
+        with self._lock:
+            jobs = {id: (fetch_profile, self.url.format(id))
+                    for id in dict.fromkeys(ids) if id not in self._profiles}
+
+        result = bulk.fetch_reports(jobs, max_workers)
+
+        with self._lock:
+            self._profiles.update(result)
+            for id in result:
+                self.errors.pop(id, None)
+            self.errors.update(result.errors)
+
+    def table(self, ids=None) -> pd.DataFrame:
+        '''
+        Returns the retrieved profiles (only those of ids, if given) as a
+        DataFrame of ATHLETE_COLS, with compact dtypes.
+
+        '''
+        with self._lock:
+            if ids is None:
+                ids = list(self._profiles)
+            else:
+                ids = [id for id in dict.fromkeys(ids) if id in self._profiles]
+            rows = [self._profiles[id] for id in ids]
+
+        df = pd.DataFrame({
+            'Athlete ID'   : pd.Series(ids, dtype=object),
+            'Athlete Name' : pd.Series([row['Athlete Name'] for row in rows], dtype=object),
+            'Age Group'    : pd.Series([row['Age Group'] for row in rows], dtype=object),
+        })
+        df[['Gender', 'Age Range']] = normalize.parse_age_groups(df['Age Group'])
+        df['Total Runs'] = schema.convert([row['Total Runs'] for row in rows], 'int')
+
+        for column in ('Age Group', 'Gender', 'Age Range'):
+            df[column] = df[column].astype('category')
+        return df[ATHLETE_COLS]
+
+    def get(self, *frames, max_workers: int = bulk.MAX_WORKERS) -> pd.DataFrame:
+        '''
+        Returns the profiles of every athlete in the reports, fetching only
+        those not already retrieved.
+
+        '''
+        ids = athlete_ids(*frames)
+        self.fetch(ids, max_workers)
+        return self.table(ids)
+
+
+#
+# Profiles are shared by every caller, so an athlete is fetched once per run
+#
+_profiles = AthleteProfiles()
+
+
+def get_athlete_profiles() -> AthleteProfiles:
+    return _profiles
+
+
+def get_athletes(*frames, max_workers: int = bulk.MAX_WORKERS) -> pd.DataFrame:
+    '''
+    Returns a table of the athletes in any number of reports (see
+    AthleteProfiles.get). Athletes whose profiles couldn't be retrieved are
+    left out, and are in get_athlete_profiles().errors.
+
+    '''
+    return _profiles.get(*frames, max_workers=max_workers)
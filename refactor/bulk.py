@@ -0,0 +1,81 @@
+from   concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from   itertools import islice
+
+#
+# This module contains functions for retrieving many reports at once.
+#
+# Each report is fetched and transformed on a thread pool, so the time spent
+# waiting on round trips overlaps rather than adding up. Errors are collected
+# per report, so one failed report doesn't lose the others.
+#
+
+MAX_WORKERS = 8
+
+
+class BulkResult(dict):
+    '''
+    Dictionary of report name to DataFrame, for the reports that succeeded.
+    Reports that failed are in errors, as report name to exception.
+
+    '''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.errors = {}
+
+
+def fetch_reports(jobs: dict, max_workers: int = MAX_WORKERS,
+                  typed: bool = False) -> BulkResult:
+    '''
+    Runs each job concurrently, where jobs is a dictionary of
+    {report name: (transform function, url)}. typed is passed on to each
+    transform function.
+
+    max_workers bounds the number of requests in flight at once, and should
+    not exceed the connection pool size of the shared client.
+
+    '''
+    result = BulkResult()
+    for name, df, error in iter_reports(jobs, max_workers, typed):
+        if error is None:
+            result[name] = df
+        else:
+            result.errors[name] = error
+    return result
+
+
+def iter_reports(jobs: dict, max_workers: int = MAX_WORKERS, typed: bool = False):
+    '''
+    Runs each job concurrently, as for fetch_reports, yielding
+    (report name, DataFrame, None) for each report as soon as it's done, or
+    (report name, None, exception) if it failed, in the order they finish.
+
+    No more than twice max_workers jobs are started ahead of the caller, so
+    only a few reports are held in memory however many jobs there are.
+
+    '''
+    if not jobs:
+        return
+
+    window = 2 * max_workers
+    items  = iter(jobs.items())
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        futures = {}
+
+        def submit():
+            for name, (function, url) in islice(items, window - len(futures)):
+                futures[executor.submit(function, url, typed)] = name
+
+        submit()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                try:
+                    df = future.result()
+                except Exception as e:
+                    yield name, None, e
+                else:
+                    yield name, df, None
+            submit()
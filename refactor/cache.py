@@ -0,0 +1,236 @@
+from   __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from   collections import namedtuple
+import lazy
+
+requests = lazy.module('requests')
+
+#
+# This module contains a persistent, on-disk cache of raw responses, keyed
+# by url.
+#
+# Each entry stores the body along with when it was fetched and the ETag /
+# Last-Modified headers returned with it. Entries are considered fresh for a
+# time-to-live which depends on the report (see TTLS). Stale entries are
+# revalidated with If-None-Match / If-Modified-Since, so an unchanged page
+# costs a 304 rather than a full download. The cache is bounded in size and
+# evicts the least recently used entries first.
+#
+# In offline mode nothing is fetched; urls are served from the cache only,
+# regardless of age.
+#
+
+MINUTE = 60
+HOUR   = 60 * MINUTE
+DAY    = 24 * HOUR
+
+#
+# Time-to-live for urls containing each pattern. The first match is used,
+# so more specific patterns go first.
+#
+TTLS = [
+    ('/countries/',                   7 * DAY),
+    ('/parkrunner/',                  7 * DAY),
+    ('results/eventhistory',          12 * HOUR),
+    ('results/latestresults',         12 * HOUR),
+    ('results/attendancerecords',     DAY),
+    ('results/',                      DAY),
+]
+
+DEFAULT_TTL       = DAY
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+CacheEntry = namedtuple('CacheEntry', ['url', 'body', 'fetched_at', 'etag',
+                                       'last_modified', 'encoding'])
+
+
+def ttl_for(url: str, ttls: list = TTLS, default: float = DEFAULT_TTL) -> float:
+    '''
+    Returns the time-to-live (in seconds) for a url.
+
+    '''
+    for pattern, ttl in ttls:
+        if pattern in url:
+            return ttl
+    return default
+
+
+def validators(entry: CacheEntry) -> dict:
+    '''
+    Returns the conditional request headers for revalidating an entry.
+
+    '''
+    headers = {}
+    if entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+    return headers
+
+
+def to_response(entry: CacheEntry) -> requests.Response:
+    '''
+    Rebuilds a requests.Response from a cache entry, so that callers can use
+    .text and .content exactly as for a live response.
+
+    '''
+    response             = requests.Response()
+    response._content    = entry.body
+    response.status_code = 200
+    response.url         = entry.url
+    response.encoding    = entry.encoding
+    response.headers     = requests.structures.CaseInsensitiveDict()
+    if entry.etag:
+        response.headers['ETag'] = entry.etag
+    if entry.last_modified:
+        response.headers['Last-Modified'] = entry.last_modified
+    return response
+
+
+class ResponseCache:
+
+    def __init__(self, path: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttls: list     = TTLS,
+                 default_ttl: float = DEFAULT_TTL,
+                 offline: bool  = False) -> None:
+        self.path        = path
+        self.max_bytes   = max_bytes
+        self.ttls        = ttls
+        self.default_ttl = default_ttl
+        self.offline     = offline
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # The cache is shared between fetch threads, so guard the connection
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url           TEXT PRIMARY KEY,
+                body          BLOB NOT NULL,
+                fetched_at    REAL NOT NULL,
+                accessed_at   REAL NOT NULL,
+                etag          TEXT,
+                last_modified TEXT,
+                encoding      TEXT,
+                size          INTEGER NOT NULL
+            )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                         'ON responses (accessed_at)')
+        self._db.commit()
+
+    def get(self, url: str) -> CacheEntry:
+        '''
+        Returns the entry for a url (fresh or not), or None if not cached.
+
+        '''
+        with self._lock:
+            row = self._db.execute(
+                'SELECT url, body, fetched_at, etag, last_modified, encoding '
+                'FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+
+            self._db.execute('UPDATE responses SET accessed_at = ? WHERE url = ?',
+                             (time.time(), url))
+            self._db.commit()
+        return CacheEntry(*row)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        age = time.time() - entry.fetched_at
+        return age < ttl_for(entry.url, self.ttls, self.default_ttl)
+
+    def put(self, url: str, response: requests.Response) -> CacheEntry:
+        '''
+        Stores a response for a url, evicting old entries if the cache is full.
+
+        '''
+        now   = time.time()
+        entry = CacheEntry(url, response.content, now,
+                           response.headers.get('ETag'),
+                           response.headers.get('Last-Modified'),
+                           response.encoding)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, entry.body, now, now, entry.etag, entry.last_modified,
+                 entry.encoding, len(entry.body)))
+            self._evict()
+            self._db.commit()
+        return entry
+
+    def touch(self, url: str, response: requests.Response = None) -> None:
+        '''
+        Marks an entry as freshly fetched, after a 304 Not Modified.
+
+        '''
+        now = time.time()
+        with self._lock:
+            self._db.execute('UPDATE responses SET fetched_at = ?, accessed_at = ? '
+                             'WHERE url = ?', (now, now, url))
+
+            # A 304 may carry updated validators
+            if response is not None:
+                for column, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+                    value = response.headers.get(header)
+                    if value:
+                        self._db.execute(f'UPDATE responses SET {column} = ? '
+                                         'WHERE url = ?', (value, url))
+            self._db.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) '
+                                    'FROM responses').fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _evict(self) -> None:
+        '''
+        Removes least recently used entries until the cache fits in max_bytes.
+        Must be called with the lock held.
+
+        '''
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) '
+                                 'FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._db.execute('SELECT url, size FROM responses '
+                                'ORDER BY accessed_at').fetchall()
+        evict = []
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            evict.append((url,))
+            total -= size
+        self._db.executemany('DELETE FROM responses WHERE url = ?', evict)
+
+
+#
+# Process-wide cache. Caching is disabled until a cache is set.
+#
+_cache = None
+
+
+def get_cache() -> ResponseCache:
+    return _cache
+
+
+def set_cache(cache: ResponseCache) -> None:
+    global _cache
+    _cache = cache
@@ -0,0 +1,212 @@
+from   __future__ import annotations
+import random
+import threading
+import time
+import lazy
+import metrics
+from   exceptions import FetchError, ResponseError, ServiceUnavailableError
+
+requests = lazy.module('requests')
+urllib3  = lazy.module('urllib3')
+
+#
+# This module contains the HTTP client that is shared by every scrape.
+#
+# A single requests.Session is reused for all urls so that connections to
+# each parkrun host (parkrun.com, parkrun.com.au, parkrun.org.uk, ...) are
+# pooled and kept alive, instead of paying a new TCP + TLS handshake for
+# every report. Transient failures (503, 429 and other 5xx responses, as
+# well as connection errors and timeouts) are retried with exponential
+# backoff and jitter before a typed exception is raised.
+#
+
+USER_AGENT = 'Chrome/43.0.2357'
+SUCCESS    = 200
+
+# Status codes which are worth retrying
+TOO_MANY_REQUESTS = 429
+NO_SERVICE        = 503
+RETRY_STATUSES    = frozenset({TOO_MANY_REQUESTS, 500, 502, NO_SERVICE, 504})
+
+
+class FetchClient:
+
+    #
+    # Defaults
+    #
+    CONNECT_TIMEOUT  = 5.0
+    READ_TIMEOUT     = 30.0
+    MAX_RETRIES      = 4
+    BACKOFF_FACTOR   = 0.5
+    BACKOFF_MAX      = 30.0
+    POOL_CONNECTIONS = 16
+    POOL_MAXSIZE     = 16
+
+    def __init__(self,
+                 connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float    = READ_TIMEOUT,
+                 max_retries: int       = MAX_RETRIES,
+                 backoff_factor: float  = BACKOFF_FACTOR,
+                 backoff_max: float     = BACKOFF_MAX,
+                 pool_connections: int  = POOL_CONNECTIONS,
+                 pool_maxsize: int      = POOL_MAXSIZE,
+                 headers: dict          = None,
+                 verify: bool           = False,
+                 limiter                = None) -> None:
+
+        self.timeout        = (connect_timeout, read_timeout)
+        self.max_retries    = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max    = backoff_max
+        self.verify         = verify
+
+        # Optional ratelimit.DomainRateLimiter, consulted before each request
+        self.limiter        = limiter
+
+        #
+        # Url prefixes to replace before requests are sent, e.g. to send
+        # requests for https://www.parkrun.com.au/... to a local server
+        # (see benchmarks/standin.py). Rate limiting and caching still use
+        # the original url.
+        #
+        self.rewrites       = {}
+
+        #
+        # Retries are handled by this class (so they can be jittered and
+        # reported), so the adapter itself must not retry
+        #
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                                pool_maxsize=pool_maxsize,
+                                                max_retries=0)
+
+        # Certificates aren't verified by default, so don't warn about it on every request
+        if not verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'user-agent': USER_AGENT})
+        if headers:
+            self.session.headers.update(headers)
+
+    def get(self, url: str, headers: dict = None,
+            ok_statuses: tuple = (SUCCESS,)) -> requests.Response:
+        '''
+        Retrieves a url, retrying transient failures.
+
+        Raises ServiceUnavailableError if the url is still throttled or
+        unavailable once retries are exhausted, ResponseError for any other
+        unexpected status code, and FetchError if no response was received.
+
+        '''
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(url)
+            try:
+                response = self.session.get(self.rewrite(url), headers=headers,
+                                            timeout=self.timeout,
+                                            verify=self.verify)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.increment('http_errors', error=type(e).__name__)
+                if attempt >= self.max_retries:
+                    raise FetchError(f'Unable to get url = {url}: {e}', url) from e
+                self._sleep(url, attempt)
+                attempt += 1
+                continue
+            except requests.RequestException as e:
+                # Anything else (e.g. too many redirects, an invalid url) won't succeed on a retry
+                metrics.increment('http_errors', error=type(e).__name__)
+                raise FetchError(f'Unable to get url = {url}: {e}', url) from e
+
+            metrics.increment('http_responses', code=str(response.status_code))
+            if response.status_code in ok_statuses:
+                return response
+
+            if response.status_code not in RETRY_STATUSES:
+                raise ResponseError(f'Invalid response.\n'\
+                                    f'Response code = {response.status_code}, URL = {url}',
+                                    url, response.status_code)
+
+            if attempt >= self.max_retries:
+                if response.status_code in (NO_SERVICE, TOO_MANY_REQUESTS):
+                    raise ServiceUnavailableError(f'Service unavailable for url = {url}',
+                                                  url, response.status_code)
+                raise ResponseError(f'Invalid response after {attempt + 1} attempts.\n'\
+                                    f'Response code = {response.status_code}, URL = {url}',
+                                    url, response.status_code)
+
+            self._sleep(url, attempt, response.headers.get('retry-after'))
+            attempt += 1
+
+    def rewrite(self, url: str) -> str:
+        '''
+        Returns the url to request for url, after applying rewrites.
+
+        '''
+        for prefix, replacement in self.rewrites.items():
+            if url.startswith(prefix):
+                return f'{replacement}{url[len(prefix):]}'
+        return url
+
+    def backoff(self, attempt: int) -> float:
+        '''
+        Returns the delay before retry number attempt + 1, using exponential
+        backoff with full jitter.
+
+        '''
+        ceiling = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def _sleep(self, url: str, attempt: int, retry_after: str = None) -> None:
+        delay = self.backoff(attempt)
+        metrics.increment('http_retries')
+
+        # Honour the server's Retry-After (in seconds) if it asks for longer
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_max))
+
+        #
+        # Hold back every request to the same site, not just this one, as the
+        # site is likely throttling all of them
+        #
+        if self.limiter is not None:
+            self.limiter.penalise(url, delay)
+
+        time.sleep(delay)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+#
+# Process-wide client
+#
+_client      = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> FetchClient:
+    '''
+    Returns the shared client, creating it with default settings on first use.
+
+    '''
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = FetchClient()
+    return _client
+
+
+def set_client(client: FetchClient) -> None:
+    '''
+    Replaces the shared client, e.g. to configure timeouts or retries.
+
+    '''
+    global _client
+    with _client_lock:
+        if _client is not None and _client is not client:
+            _client.close()
+        _client = client
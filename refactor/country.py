@@ -1,54 +1,70 @@
+from   __future__ import annotations
+import bulk
+import registry
 import scrape as gd
-import transform
 
 class Country:
 
-    ATTENDANCE_RECORDS   = 'results/attendancerecords'
-    MOST_EVENTS          = 'results/mostevents'
-    LARGEST_CLUBS        = 'results/largestclubs'
-    HUNDRED_CLUBBERS     = 'results/100clubbers'
-    NOT_PARKRUN          = 'results/notparkrun'
-    FREEDOM_FINISHERS    = 'results/freedom'
-    MOST_FIRST_FINISHES  = 'results/mostfirstfinishes'
-    FIRST_FINISHERS      = 'results/firstfinishers'
-    SUB_SEVENTEEN        = 'results/sub17'
-    TOP_AGE_GRADE        = 'results/topagegrade'
-    NEW_CATEGORY_RECORDS = 'results/newcategoryrecords'
-    COURSE_RECORDS       = 'results/courserecords'    
+    # Paths of each report, relative to the country's url (see registry.py)
+    ATTENDANCE_RECORDS   = registry.path_for('attendance_records',    registry.COUNTRY)
+    MOST_EVENTS          = registry.path_for('most_events_attended',  registry.COUNTRY)
+    LARGEST_CLUBS        = registry.path_for('largest_clubs',         registry.COUNTRY)
+    HUNDRED_CLUBBERS     = registry.path_for('hundred_clubbers',      registry.COUNTRY)
+    NOT_PARKRUN          = registry.path_for('not_parkrunners',       registry.COUNTRY)
+    FREEDOM_FINISHERS    = registry.path_for('freedom_finishers',     registry.COUNTRY)
+    MOST_FIRST_FINISHES  = registry.path_for('most_first_finishes',   registry.COUNTRY)
+    FIRST_FINISHERS      = registry.path_for('first_finishers',       registry.COUNTRY)
+    SUB_SEVENTEEN        = registry.path_for('sub_seventeen_runners', registry.COUNTRY)
+    TOP_AGE_GRADE        = registry.path_for('top_age_grade',         registry.COUNTRY)
+    NEW_CATEGORY_RECORDS = registry.path_for('new_category_records',  registry.COUNTRY)
+    COURSE_RECORDS       = registry.path_for('course_records',        registry.COUNTRY)
+
+    #
+    # Reports available through fetch_all(), as {name: (path, transform)}
+    # (see registry.py)
+    #
+    REPORTS = registry.reports(registry.COUNTRY)
 
     def __init__(self, name) -> None:
-        self.name = name
-        self.url, \
-        self.info = gd.get_country_details(name)
+        self.name     = name
+        self._details = None
 
         # self.locations = get_locations(name) # To be used for retrieving all country data
 
-        pass
+    #
+    # The url and info of the country are only looked up when first used, so
+    # creating a Country doesn't touch the network
+    #
+    @property
+    def url(self) -> str:
+        return self.details()[0]
+
+    @property
+    def info(self) -> str:
+        return self.details()[1]
+
+    def details(self) -> tuple:
+        if self._details is None:
+            self._details = gd.get_country_details(self.name)
+        return self._details
 
     # def get_locations(self):
-    #     url = f"{self.url}{Country.ATTENDANCE_RECORDS}"
+    #     url = registry.url_for('attendance_records', registry.COUNTRY, self.url)
     #         # Get table data
     #     df = gd.get_html_table(url)
 
     #     return df
     
-    def get_attendance_records(self):
-
-        url = f'{self.url}{Country.ATTENDANCE_RECORDS}'
-        df  = transform.get_attendance_records(url)
-        return df
+    def get_attendance_records(self, typed: bool = False):
+        return registry.run('attendance_records', registry.COUNTRY, self.url, typed)
     
-    def get_most_events_attended(self):
-        url = f'{self.url}{Country.MOST_EVENTS}'
-        df  = transform.get_most_events_attended(url)
-        return df
+    def get_most_events_attended(self, typed: bool = False):
+        return registry.run('most_events_attended', registry.COUNTRY, self.url, typed)
     
-    def get_largest_clubs(self):
-        url = f'{self.url}{Country.LARGEST_CLUBS}'
-        df  = transform.get_largest_clubs(url)
-        return df
+    def get_largest_clubs(self, typed: bool = False):
+        return registry.run('largest_clubs', registry.COUNTRY, self.url, typed)
     
-    def get_freedom_finishers(self):
+    def get_freedom_finishers(self, typed: bool = False):
         '''
         This was initially for during covid, and in limited countries. No longer
         available in some countries, and may soon get deprecated. 
@@ -56,37 +72,47 @@ class Country:
         Unavailable in Japan for example
 
         '''
-        url = f'{self.url}{Country.FREEDOM_FINISHERS}'
-        df  = transform.get_freedom_finishers(url)
-        return df
+        return registry.run('freedom_finishers', registry.COUNTRY, self.url, typed)
     
-    def get_most_first_finishes(self):
-        url = f'{self.url}{Country.MOST_FIRST_FINISHES}'
-        df  = transform.get_most_first_finishes(url)
-        return df
+    def get_most_first_finishes(self, typed: bool = False):
+        return registry.run('most_first_finishes', registry.COUNTRY, self.url, typed)
     
-    def get_first_finishers(self):
-        url = f'{self.url}{Country.FIRST_FINISHERS}'
-        df = transform.get_first_finishers(url)
-        return df
+    def get_first_finishers(self, typed: bool = False):
+        return registry.run('first_finishers', registry.COUNTRY, self.url, typed)
     
-    def get_sub_seventeen_runners(self):
-        url = f'{self.url}{Country.SUB_SEVENTEEN}'
-        df = transform.get_sub_seventeen_runners(url)
-        return df
+    def get_sub_seventeen_runners(self, typed: bool = False):
+        return registry.run('sub_seventeen_runners', registry.COUNTRY, self.url, typed)
     
-    def get_top_age_grade(self):
-        url = f'{self.url}{Country.TOP_AGE_GRADE}'
-        df  = transform.get_top_age_grade(url)
-
-        return df
+    def get_top_age_grade(self, typed: bool = False):
+        return registry.run('top_age_grade', registry.COUNTRY, self.url, typed)
     
-    def get_new_category_records(self):
-        url = f'{self.url}{Country.NEW_CATEGORY_RECORDS}'
-        df  = transform.get_new_category_records(url)
-        return df
+    def get_new_category_records(self, typed: bool = False):
+        return registry.run('new_category_records', registry.COUNTRY, self.url, typed)
     
-    def get_course_records(self):
-        url = f'{self.url}{Country.COURSE_RECORDS}'
-        df  = transform.get_course_records(url)
-        return df
\ No newline at end of file
+    def get_course_records(self, typed: bool = False):
+        return registry.run('course_records', registry.COUNTRY, self.url, typed)
+
+    def get_not_parkrunners(self, typed: bool = False):
+        return registry.run('not_parkrunners', registry.COUNTRY, self.url, typed)
+
+    def get_report(self, name: str, typed: bool = False, columns: list = None):
+        '''
+        Retrieves any country report by name (see registry.py), optionally
+        only the given columns.
+
+        '''
+        return registry.run(name, registry.COUNTRY, self.url, typed, columns=columns)
+
+    def fetch_all(self, reports=None, max_workers: int = bulk.MAX_WORKERS,
+                  typed: bool = False) -> bulk.BulkResult:
+        '''
+        Retrieves several reports for this country concurrently, returning a
+        dictionary of report name (see REPORTS) to DataFrame. Defaults to
+        every report.
+
+        Reports which fail are left out, and their exceptions are available
+        from the errors attribute of the result. With typed=True, columns have
+        native dtypes (see transform.py).
+
+        '''
+        return registry.fetch_all(reports, registry.COUNTRY, self.url, max_workers, typed)
@@ -0,0 +1,172 @@
+import difflib
+import json
+import os
+import threading
+import time
+from   exceptions import CountryNotFoundError
+from   files import atomic_write
+
+#
+# This module contains a process-wide registry of parkrun countries.
+#
+# The countries page (https://www.parkrun.com/countries/) is downloaded and
+# parsed once, then shared by Parkrun and every Country. Names are indexed
+# (along with common aliases) when the registry is loaded, so resolving a
+# country name is a dictionary lookup, and fuzzy matching is only needed
+# (and then remembered) for names that aren't in the index.
+#
+
+#
+# Alternative names for countries, mapped to the name used by parkrun
+#
+ALIASES = {
+    'uk'                       : 'United Kingdom',
+    'great britain'            : 'United Kingdom',
+    'britain'                  : 'United Kingdom',
+    'england'                  : 'United Kingdom',
+    'scotland'                 : 'United Kingdom',
+    'wales'                    : 'United Kingdom',
+    'northern ireland'         : 'United Kingdom',
+    'us'                       : 'USA',
+    'united states'            : 'USA',
+    'united states of america' : 'USA',
+    'america'                  : 'USA',
+    'nz'                       : 'New Zealand',
+    'aus'                      : 'Australia',
+    'swaziland'                : 'Eswatini',
+    'holland'                  : 'Netherlands',
+}
+
+
+def normalise(name: str) -> str:
+    '''
+    Returns the key used to index a country name.
+
+    '''
+    return ' '.join(name.casefold().split())
+
+
+class CountryRegistry:
+
+    def __init__(self, loader, path: str = None, max_age: float = None) -> None:
+        '''
+        loader  - function returning a dictionary of countries, in the form
+                  {name: {'info': ..., 'url': ...}}
+        path    - optional file to persist the countries to, and to load them
+                  from instead of calling loader
+        max_age - age (in seconds) after which the file at path is ignored
+
+        '''
+        self.loader  = loader
+        self.path    = path
+        self.max_age = max_age
+
+        self._lock      = threading.RLock()
+        self._countries = None
+        self._index     = {}
+        self._matches   = {}
+
+    def countries(self) -> dict:
+        '''
+        Returns a dictionary of all countries, loading them on first use.
+
+        '''
+        with self._lock:
+            if self._countries is None:
+                if not self._load_file():
+                    self._set(self.loader())
+                    if self.path:
+                        self.save()
+            return dict(self._countries)
+
+    def refresh(self) -> dict:
+        '''
+        Reloads the countries using the loader, replacing any held in memory
+        or on disk.
+
+        '''
+        with self._lock:
+            self._set(self.loader())
+            if self.path:
+                self.save()
+            return dict(self._countries)
+
+    def lookup(self, name: str) -> str:
+        '''
+        Returns the parkrun name of the country closest to name.
+
+        '''
+        countries = self.countries()
+        key       = normalise(name)
+
+        with self._lock:
+            c_name = self._index.get(key) or self._matches.get(key)
+            if c_name:
+                return c_name
+
+            matches = difflib.get_close_matches(key, list(self._index), n=1)
+            if not matches:
+                raise CountryNotFoundError(f'Unable to find {name} in {list(countries)}')
+
+            c_name             = self._index[matches[0]]
+            self._matches[key] = c_name
+        return c_name
+
+    def details(self, name: str) -> tuple:
+        '''
+        Returns the url (ending in a forward slash) and info for a country.
+
+        '''
+        c_name  = self.lookup(name)
+        country = self.countries()[c_name]
+
+        info = country['info']
+        url  = country['url']
+
+        if not url:
+            raise CountryNotFoundError(f'Unable to find url for {name}')
+        if not info:
+            raise CountryNotFoundError(f'Unable to find info for {name}')
+
+        # Add a forward slash if it's not at the end the generated url
+        if url[-1] != '/':
+            url = f'{url}/'
+
+        return url, info
+
+    def save(self, path: str = None) -> None:
+        path = path or self.path
+
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(self._countries, f, indent=2)
+
+        with self._lock:
+            atomic_write(path, write)
+
+    def load(self, path: str = None) -> dict:
+        path = path or self.path
+        with open(path) as f:
+            countries = json.load(f)
+        with self._lock:
+            self._set(countries)
+            return dict(self._countries)
+
+    def _load_file(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        if self.max_age is not None and \
+                time.time() - os.path.getmtime(self.path) > self.max_age:
+            return False
+        self.load()
+        return True
+
+    def _set(self, countries: dict) -> None:
+        index = {normalise(name): name for name in countries}
+        for alias, name in ALIASES.items():
+            if name in countries:
+                index.setdefault(alias, name)
+
+        self._countries = countries
+        self._index     = index
+        self._matches   = {}
@@ -0,0 +1,218 @@
+from   collections import namedtuple
+import pandas as pd
+import store
+
+#
+# This module compares two snapshots of a report (see store.py) and returns
+# only what changed between them, e.g. new course records, athletes entering
+# the most events table, or clubs whose counts changed. Alerts and
+# dashboards can then process the small weekly delta rather than every row.
+#
+# Rows are matched on key columns with a hash join: each row's non-key
+# columns are reduced to a single 64-bit hash, and the two snapshots are
+# merged on their keys, so only the hashes are compared rather than every
+# column. Rows are:
+#   - inserted : key only in the new snapshot
+#   - removed  : key only in the old snapshot
+#   - changed  : key in both, with different values (previous has the old
+#                values, row for row)
+#
+# If a key appears more than once in a snapshot, occurrences are matched in
+# order.
+#
+# Both snapshots should be typed, or both untyped (see transform.py), since
+# typed values differ from the text they're parsed from. Other differences
+# in dtype (e.g. int64 and Int64, or category and object) are evened out
+# before hashing, see _comparable().
+#
+
+#
+# Key columns of each report (names as in Parkrun.REPORTS)
+#
+KEYS = {
+    'first_finishers'       : ['Event', 'Gender'],
+    'sub_seventeen_runners' : ['Event', 'Athlete ID'],
+    'top_age_grade'         : ['Event', 'Athlete ID'],
+    'new_category_records'  : ['Event', 'Athlete ID'],
+    'course_records'        : ['Event', 'Gender'],
+    'freedom_finishers'     : ['Athlete ID', 'Date', 'Location'],
+    'attendance_records'    : ['Event'],
+    'most_events_attended'  : ['Athlete ID'],
+    'most_first_finishes'   : ['Athlete ID'],
+    'largest_clubs'         : ['Club Name'],
+    'event_history'         : ['Event Number'],
+    'event_results'         : ['Athlete ID'],
+}
+
+# Keys for other reports, used if the report has one of these columns
+DEFAULT_KEYS = ['Athlete ID', 'Event', 'Club Name']
+
+_OCCURRENCE = '__occurrence'
+_HASH       = '__hash'
+_ROW        = '__row'
+
+
+class Delta(namedtuple('Delta', ['inserted', 'removed', 'changed', 'previous'])):
+
+    @property
+    def empty(self) -> bool:
+        return self.inserted.empty and self.removed.empty and self.changed.empty
+
+    def __len__(self) -> int:
+        return len(self.inserted) + len(self.removed) + len(self.changed)
+
+
+def keys_for(report: str, df: pd.DataFrame) -> list:
+    '''
+    Returns the key columns of report, or the first of DEFAULT_KEYS in df
+    for any other report.
+
+    '''
+    if report in KEYS:
+        return KEYS[report]
+    for key in DEFAULT_KEYS:
+        if key in df.columns:
+            return [key]
+    raise ValueError(f'No key columns known for report = {report}, pass keys explicitly')
+
+
+def _as_text(column: pd.Series) -> pd.Series:
+    '''
+    Returns column as text, with missing values (NaN, None, NA, NaT) as ''.
+
+    '''
+    return column.astype(str).where(column.notna(), '')
+
+
+def _is_text(column: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(column.dtype) or \
+           pd.api.types.is_string_dtype(column.dtype) or \
+           isinstance(column.dtype, pd.CategoricalDtype)
+
+
+def _comparable(old: pd.DataFrame, new: pd.DataFrame, keys: list, values: list) -> tuple:
+    '''
+    Returns the keys and values of old and new, with each column whose dtype
+    differs between them converted to one representation in both, so equal
+    values hash (and join) the same:
+      - keys are compared as text
+      - numeric values (e.g. int64 and Int64 with NA) as float64
+      - other values as text, unless one snapshot is typed and the other
+        isn't (text against native dtypes, see transform.py), whose values
+        differ (e.g. '17:01' and 0 days 00:17:01), which raises ValueError
+
+    '''
+    old = old[keys + values].reset_index(drop=True)
+    new = new[keys + values].reset_index(drop=True)
+    for column in keys + values:
+        if old[column].dtype == new[column].dtype:
+            continue
+
+        if column in values and pd.api.types.is_numeric_dtype(old[column].dtype) and \
+                                pd.api.types.is_numeric_dtype(new[column].dtype):
+            old[column] = old[column].astype('float64')
+            new[column] = new[column].astype('float64')
+            continue
+
+        if column in values and _is_text(old[column]) != _is_text(new[column]) and \
+                                old[column].notna().any() and new[column].notna().any():
+            raise ValueError(f'Column {column} is {old[column].dtype} in the old snapshot and '\
+                             f'{new[column].dtype} in the new one, compare typed snapshots '\
+                             f'with typed ones')
+
+        old[column] = _as_text(old[column])
+        new[column] = _as_text(new[column])
+    return old, new
+
+
+def _hashed(df: pd.DataFrame, keys: list, values: list) -> pd.DataFrame:
+    '''
+    Returns the keys of df, with an occurrence count (for repeated keys),
+    a hash of the value columns and the row position.
+
+    '''
+    hashed = df[keys].copy()
+    hashed[_OCCURRENCE] = hashed.groupby(keys, sort=False, dropna=False).cumcount()
+    if values:
+        hashed[_HASH] = pd.util.hash_pandas_object(df[values], index=False).to_numpy()
+    else:
+        hashed[_HASH] = 0
+    hashed[_ROW] = range(len(df))
+    return hashed
+
+
+def diff(old: pd.DataFrame, new: pd.DataFrame, keys) -> Delta:
+    '''
+    Returns the rows inserted, removed and changed from old to new, matching
+    rows on the keys column(s). Only columns in both snapshots are compared.
+
+    '''
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    for name, df in (('old', old), ('new', new)):
+        missing = [key for key in keys if key not in df.columns]
+        if missing:
+            raise ValueError(f'Key columns {missing} not in {name} snapshot, '\
+                             f'columns = {list(df.columns)}')
+
+    values = [column for column in new.columns if column in old.columns and column not in keys]
+
+    old_compared, new_compared = _comparable(old, new, keys, values)
+    old_hashed = _hashed(old_compared, keys, values)
+    new_hashed = _hashed(new_compared, keys, values)
+
+    merged = new_hashed.merge(old_hashed, on=keys + [_OCCURRENCE], how='outer',
+                              suffixes=('_new', '_old'), indicator=True)
+
+    inserted = merged.loc[merged['_merge'] == 'left_only',  f'{_ROW}_new']
+    removed  = merged.loc[merged['_merge'] == 'right_only', f'{_ROW}_old']
+    both     = merged[(merged['_merge'] == 'both') &
+                      (merged[f'{_HASH}_new'] != merged[f'{_HASH}_old'])]
+
+    return Delta(inserted = new.iloc[sorted(inserted.astype(int))].reset_index(drop=True),
+                 removed  = old.iloc[sorted(removed.astype(int))].reset_index(drop=True),
+                 changed  = new.iloc[both[f'{_ROW}_new'].astype(int)].reset_index(drop=True),
+                 previous = old.iloc[both[f'{_ROW}_old'].astype(int)].reset_index(drop=True))
+
+
+def diff_report(report: str, old: pd.DataFrame, new: pd.DataFrame, keys=None) -> Delta:
+    '''
+    Returns the delta between two snapshots of report, keyed by KEYS unless
+    keys are given.
+
+    '''
+    return diff(old, new, keys or keys_for(report, new))
+
+
+def diff_snapshots(results: store.ResultStore, report: str, scope: str = store.GLOBAL,
+                   old_date=None, new_date=None, keys=None) -> Delta:
+    '''
+    Returns the delta between two snapshots of report in a result store:
+    by default the latest snapshot and the one before it. Every row of the
+    new snapshot is inserted if there's no older snapshot.
+
+    Identical snapshots (same content hash) aren't compared row by row.
+
+    '''
+    catalog = results.snapshots(report, scope)
+    if new_date is not None:
+        catalog = catalog[catalog['snapshot_date'] <= store.iso_date(new_date)]
+    if catalog.empty:
+        raise ValueError(f'No snapshots of report = {report} for scope = {scope}')
+
+    new_snapshot = catalog.iloc[-1]
+    if old_date is not None:
+        older = catalog[catalog['snapshot_date'] == store.iso_date(old_date)]
+    else:
+        older = catalog.iloc[-2:-1]
+
+    new = results.snapshot(report, scope, new_snapshot['snapshot_date'])
+    if older.empty:
+        return diff_report(report, new.iloc[0:0], new, keys)
+
+    old_snapshot = older.iloc[-1]
+    if old_snapshot['content_hash'] == new_snapshot['content_hash']:
+        empty = new.iloc[0:0]
+        return Delta(empty, empty, empty, empty)
+
+    old = results.snapshot(report, scope, old_snapshot['snapshot_date'])
+    return diff_report(report, old, new, keys)
@@ -1,8 +1,9 @@
-import requests
-import sys
-import pandas as pd
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from   __future__ import annotations
+import lazy
+import scrape
+import transform
+
+pd = lazy.module('pandas')
 
 
 class Event:
@@ -32,5 +33,21 @@ class Event:
         self.country  = country
         self.location = location
         self.event_no = event_no
-        
+
+    @property
+    def url(self) -> str:
+        '''
+        Url of the results of this event, or of the latest event at the
+        location if there is no event number.
+        e.g. https://www.parkrun.com.au/albertmelbourne/results/250/
+
+        '''
+        country_url, _ = scrape.get_country_details(self.country)
+        if self.event_no is None:
+            return f'{country_url}{self.location}/results/latestresults/'
+        return f'{country_url}{self.location}/results/{self.event_no}/'
+
+    def get_results(self, typed: bool = False) -> pd.DataFrame:
+        df = transform.get_event_results(self.url, typed)
+        return df
 
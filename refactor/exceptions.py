@@ -0,0 +1,72 @@
+#
+# Exceptions raised while scraping and processing parkrun data.
+#
+# Everything raised by this package derives from ScrapeError, so a caller
+# (e.g. a long crawl) can catch a single type and decide whether to skip the
+# report or stop, rather than having the whole process exit.
+#
+
+
+class ScrapeError(Exception):
+    '''
+    Base class for all errors raised while retrieving parkrun data.
+
+    '''
+
+
+class FetchError(ScrapeError):
+    '''
+    A url could not be retrieved, e.g. connection failure or timeout.
+
+    '''
+
+    def __init__(self, message: str, url: str = None) -> None:
+        super().__init__(message)
+        self.url = url
+
+
+class ResponseError(FetchError):
+    '''
+    A url returned a response with an unexpected status code.
+
+    '''
+
+    def __init__(self, message: str, url: str = None, status_code: int = None) -> None:
+        super().__init__(message, url)
+        self.status_code = status_code
+
+
+class ServiceUnavailableError(ResponseError):
+    '''
+    A url kept returning 503 (or 429) after all retries were used up.
+
+    '''
+
+
+class ParseError(ScrapeError):
+    '''
+    A page was retrieved but its contents could not be processed.
+
+    '''
+
+
+class CacheMissError(FetchError):
+    '''
+    A url was requested in offline mode but is not in the cache.
+
+    '''
+
+
+class ArchiveMissError(FetchError):
+    '''
+    A url was requested while replaying the archive but is not archived (as
+    of the time asked for).
+
+    '''
+
+
+class CountryNotFoundError(ScrapeError, KeyError):
+    '''
+    A country name could not be matched to a parkrun country.
+
+    '''
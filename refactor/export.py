@@ -0,0 +1,274 @@
+import os
+import time
+import pandas as pd
+import bulk
+import scrape
+import sweep
+from   ratelimit import DomainRateLimiter
+
+#
+# This module writes reports out as they're retrieved, rather than
+# collecting every page of a crawl into one DataFrame first, which doesn't
+# fit in memory for location level crawls (every event at every location).
+#
+# Each page is appended to the file for its report as soon as it has been
+# transformed, then dropped, e.g. for a sweep of every country:
+#
+#   export_sweep(['course_records', 'largest_clubs'], 'out', format='parquet')
+#
+# writes out/course_records.parquet and out/largest_clubs.parquet, with a
+# 'Country' column added. Formats are:
+#   - csv     : header written once, then rows appended
+#   - ndjson  : one JSON object per row
+#   - parquet : one row group per page (needs pyarrow)
+#
+# Progress is reported after each page.
+#
+
+
+class CSVWriter:
+
+    extension = 'csv'
+
+    def __init__(self, path: str) -> None:
+        self.path    = path
+        self.columns = None
+        self._file   = open(path, 'w', newline='', encoding='utf-8')
+
+    def write(self, df: pd.DataFrame) -> None:
+        # Keep to the first page's columns, so every row lines up with the header
+        if self.columns is None:
+            self.columns = list(df.columns)
+            df.to_csv(self._file, index=False)
+        else:
+            df.reindex(columns=self.columns).to_csv(self._file, index=False, header=False)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class NDJSONWriter:
+
+    extension = 'ndjson'
+
+    def __init__(self, path: str) -> None:
+        self.path  = path
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        # Older pandas doesn't end the last record with a newline
+        chunk = df.to_json(orient='records', lines=True, date_format='iso')
+        self._file.write(chunk if chunk.endswith('\n') else f'{chunk}\n')
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    '''
+    Writes pages to one Parquet file, whose schema is fixed by the first
+    page: later pages are cast to it, and a page which can't be (e.g. text
+    in a column which was numeric) raises ValueError.
+
+    '''
+
+    extension = 'parquet'
+
+    def __init__(self, path: str) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path    = path
+        self._pa     = pa
+        self._pq     = pq
+        self._schema = None
+        self._writer = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        pa = self._pa
+
+        # Categories differ from page to page, so write their values instead
+        df = df.astype({column: str for column, dtype in df.dtypes.items()
+                        if isinstance(dtype, pd.CategoricalDtype)})
+
+        if self._writer is None:
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+
+            # Integers are downcast to fit each page, so widen them to fit every page,
+            # and columns with no values on the first page are taken to be text
+            fields = [pa.field(field.name, pa.int64()) if pa.types.is_integer(field.type) else
+                      pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                      for field in schema]
+            self._schema = pa.schema(fields)
+            self._writer = self._pq.ParquetWriter(self.path, self._schema)
+
+        df = df.reindex(columns=self._schema.names)
+        try:
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f'Page does not fit the schema of {self.path}: {e}') from e
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+WRITERS = {
+    'csv'     : CSVWriter,
+    'ndjson'  : NDJSONWriter,
+    'parquet' : ParquetWriter,
+}
+
+
+class Progress:
+    '''
+    Prints progress through a crawl, after each page.
+
+    '''
+
+    def __init__(self, total: int) -> None:
+        self.total  = total
+        self.done   = 0
+        self.failed = 0
+        self.rows   = 0
+        self.start  = time.perf_counter()
+
+    def update(self, name, rows: int = 0, error: Exception = None) -> None:
+        self.done += 1
+        self.rows += rows
+        if error is not None:
+            self.failed += 1
+
+        rate   = self.done / max(time.perf_counter() - self.start, 1e-9)
+        status = f'FAILED: {error}' if error is not None else f'{rows:,} rows'
+        print(f'[{self.done}/{self.total}] {name}: {status} '
+              f'({self.rows:,} rows in total, {rate:.1f} pages/s)')
+
+
+class Exporter:
+    '''
+    Appends pages of reports to one file per report in directory, in format
+    (see WRITERS). Use as a context manager, or call close() when done.
+
+    '''
+
+    def __init__(self, directory: str, format: str = 'csv') -> None:
+        if format not in WRITERS:
+            raise ValueError(f'Unknown format = {format}, expected one of {list(WRITERS)}')
+
+        self.directory = directory
+        self.format    = format
+        self.rows      = {}
+        self._writers  = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, report: str) -> str:
+        return os.path.join(self.directory, f'{report}.{WRITERS[self.format].extension}')
+
+    def write(self, report: str, df: pd.DataFrame, columns: dict = None) -> None:
+        '''
+        Appends a page of report, with any columns (name to value) added
+        at the start, e.g. {'Country': 'Australia'}.
+
+        '''
+        if columns:
+            for position, (name, value) in enumerate(columns.items()):
+                df.insert(position, name, value)
+
+        if report not in self._writers:
+            self._writers[report] = WRITERS[self.format](self.path(report))
+        self._writers[report].write(df)
+        self.rows[report] = self.rows.get(report, 0) + len(df)
+
+    def close(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def __enter__(self) -> 'Exporter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def export_jobs(jobs: dict, exporter: Exporter, describe,
+                max_workers: int = bulk.MAX_WORKERS, typed: bool = False,
+                progress: bool = True) -> dict:
+    '''
+    Runs jobs (see bulk.fetch_reports) and writes each page with exporter as
+    soon as it's done. describe is passed each job's key, and returns the
+    report name and the columns to add, e.g.
+    ('course_records', {'Country': 'Australia'}).
+
+    Returns the exceptions of failed jobs, by key, including pages which
+    were retrieved but couldn't be written (e.g. one which doesn't fit the
+    schema a Parquet file took from its first page, see ParquetWriter).
+
+    '''
+    tracker = Progress(len(jobs)) if progress else None
+    errors  = {}
+
+    for key, df, error in bulk.iter_reports(jobs, max_workers, typed):
+        report, columns = describe(key)
+        if error is None:
+            try:
+                exporter.write(report, df, columns)
+            except Exception as e:
+                error = e
+
+        if error is not None:
+            errors[key] = error
+
+        if tracker is not None:
+            label = ' '.join(str(value) for value in (report, *columns.values()))
+            tracker.update(label, 0 if error is not None else len(df), error)
+
+    return errors
+
+
+def export_sweep(reports, directory: str, format: str = 'csv', countries=None,
+                 rate: float = DomainRateLimiter.RATE,
+                 burst: float = DomainRateLimiter.BURST,
+                 max_workers: int = sweep.MAX_WORKERS,
+                 typed: bool = False, progress: bool = True) -> dict:
+    '''
+    Runs one or more country reports for each country, as sweep.sweep()
+    does, writing each country's page to a file per report as it's done.
+
+    Returns the exceptions of failed pages, keyed by (report, country).
+
+    '''
+    if isinstance(reports, str):
+        reports = [reports]
+    if countries is None:
+        countries = list(scrape.get_countries())
+
+    jobs = sweep.sweep_jobs(reports, countries)
+
+    with sweep.rate_limited(rate, burst), Exporter(directory, format) as exporter:
+        return export_jobs(jobs, exporter, sweep.describe_sweep, max_workers, typed, progress)
+
+
+def export_locations(locations: list, directory: str, format: str = 'csv', since: dict = None,
+                     rate: float = DomainRateLimiter.RATE,
+                     burst: float = DomainRateLimiter.BURST,
+                     max_workers: int = sweep.MAX_WORKERS,
+                     typed: bool = False, progress: bool = True) -> dict:
+    '''
+    Writes the results of every event at each location (see location.py)
+    to event_results.<format> in directory, with 'Country', 'Location' and
+    'Event Number' columns added. since optionally gives the last event
+    already exported for each location, by Location.key.
+
+    Returns the exceptions of failed events, keyed by (Location.key, event
+    number), with failed event histories keyed by (Location.key, None).
+
+    '''
+    with sweep.rate_limited(rate, burst), Exporter(directory, format) as exporter:
+        jobs, describe, errors = sweep.location_jobs(locations, since)
+        errors.update(export_jobs(jobs, exporter, describe, max_workers, typed, progress))
+    return errors
@@ -0,0 +1,32 @@
+import os
+import threading
+
+#
+# This module contains helpers for writing files which other processes (or
+# threads) may be reading, or which a crash mustn't leave half written.
+#
+
+
+def atomic_write(path: str, writer) -> None:
+    '''
+    Writes the file at path by calling writer with a temporary path next to
+    it, then moving that into place, so a reader sees either the old file or
+    the whole new one, never half a file. The directory is created if
+    needed, and the temporary file is removed if writer fails, e.g.
+
+        atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Unique to the writer, so concurrent writes of the same path don't clash
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
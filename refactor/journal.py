@@ -0,0 +1,332 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from   collections import namedtuple
+from   urllib.parse import quote
+import pandas as pd
+import bulk
+import scrape
+import sweep
+from   export import Progress
+from   files import atomic_write
+from   ratelimit import DomainRateLimiter
+
+#
+# This module runs long crawls so that they can be stopped and resumed,
+# rather than started again from scratch after a failure (e.g. a 503 three
+# hours into a location level crawl).
+#
+# A journal (SQLite, in the crawl's directory) records every page of the
+# crawl as planned, done or failed. Each page's report is written to its own
+# Parquet file as soon as it's transformed (to a temporary file first, so a
+# crash never leaves half a file), and only then marked done. Running the
+# same crawl again skips every page already done and retries only the
+# planned and failed ones, e.g.
+#
+#   errors = journal.crawl_sweep(['course_records', 'largest_clubs'], 'crawl')
+#   ...    (stopped, or some countries failed; run again to resume)
+#   errors = journal.crawl_sweep(['course_records', 'largest_clubs'], 'crawl')
+#   df     = journal.read('crawl', 'course_records')
+#
+# Files are laid out as <directory>/<report>/<label>/.../<label>.parquet,
+# e.g. crawl/course_records/Australia.parquet, with the labels (e.g.
+# 'Country') added as columns.
+#
+# Parquet support needs pyarrow (or fastparquet) to be installed.
+#
+
+PLANNED = 'planned'
+DONE    = 'done'
+FAILED  = 'failed'
+
+JOURNAL_FILE = 'journal.sqlite'
+
+JournalEntry = namedtuple('JournalEntry', ['key', 'report', 'url', 'status', 'attempts',
+                                           'error', 'path', 'updated_at'])
+
+
+#
+# Keys of jobs (e.g. ('course_records', 'Australia')) are stored as JSON
+#
+def encode_key(key) -> str:
+    return json.dumps(list(key) if isinstance(key, tuple) else key)
+
+
+def decode_key(text: str):
+    key = json.loads(text)
+    return tuple(key) if isinstance(key, list) else key
+
+
+class Journal:
+    '''
+    Records the state of each page of a crawl, by job key, in a SQLite
+    database at path.
+
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path  = path
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                key        TEXT PRIMARY KEY,
+                report     TEXT NOT NULL,
+                url        TEXT NOT NULL,
+                status     TEXT NOT NULL,
+                attempts   INTEGER NOT NULL DEFAULT 0,
+                error      TEXT,
+                path       TEXT,
+                planned_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+        self._db.commit()
+
+    def plan(self, jobs: dict, reports: dict) -> int:
+        '''
+        Adds the jobs ({key: (transform function, url)}) not already in the
+        journal as planned, with the report name of each key from reports.
+        Returns the number added.
+
+        '''
+        now = time.time()
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany('INSERT OR IGNORE INTO jobs (key, report, url, status, planned_at, '
+                                 'updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                                 [(encode_key(key), reports[key], url, PLANNED, now, now)
+                                  for key, (_, url) in jobs.items()])
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def mark_done(self, key, path: str) -> None:
+        with self._lock:
+            self._db.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, error = NULL, '
+                             'path = ?, updated_at = ? WHERE key = ?',
+                             (DONE, path, time.time(), encode_key(key)))
+            self._db.commit()
+
+    def mark_failed(self, key, error: Exception) -> None:
+        with self._lock:
+            self._db.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, error = ?, '
+                             'updated_at = ? WHERE key = ?',
+                             (FAILED, f'{type(error).__name__}: {error}', time.time(),
+                              encode_key(key)))
+            self._db.commit()
+
+    def pending(self, retry_failed: bool = True, max_attempts: int = None) -> list:
+        '''
+        Returns the keys of jobs still to run, in the order they were
+        planned: planned jobs, and failed jobs if retry_failed (and they've
+        been tried fewer than max_attempts times).
+
+        '''
+        conditions = [f"status = '{PLANNED}'"]
+        params     = []
+        if retry_failed:
+            if max_attempts is None:
+                conditions.append(f"status = '{FAILED}'")
+            else:
+                conditions.append(f"(status = '{FAILED}' AND attempts < ?)")
+                params.append(max_attempts)
+
+        with self._lock:
+            rows = self._db.execute(f'SELECT key FROM jobs WHERE {" OR ".join(conditions)} '
+                                    f'ORDER BY planned_at, rowid', params).fetchall()
+        return [decode_key(key) for key, in rows]
+
+    def entries(self, status: str = None, report: str = None) -> list:
+        '''
+        Returns the journal (optionally only jobs with status and/or for
+        report), in the order jobs were planned.
+
+        '''
+        conditions = []
+        params     = []
+        for column, value in (('status', status), ('report', report)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+
+        query = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        with self._lock:
+            rows = self._db.execute(f'SELECT key, report, url, status, attempts, error, path, '
+                                    f'updated_at FROM jobs {query} ORDER BY planned_at, rowid',
+                                    params).fetchall()
+        return [JournalEntry(decode_key(key), *rest) for key, *rest in rows]
+
+    def counts(self) -> dict:
+        '''
+        Returns the number of jobs by status.
+
+        '''
+        with self._lock:
+            rows = self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {PLANNED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def failures(self) -> dict:
+        '''
+        Returns the last error of each failed job, by key.
+
+        '''
+        return {entry.key: entry.error for entry in self.entries(FAILED)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def output_path(report: str, columns: dict) -> str:
+    '''
+    Returns the path (relative to the crawl's directory) of the file for one
+    page of report, with a directory for each label but the last, e.g.
+    event_results/Australia/Albert%20Melbourne/12.parquet.
+
+    '''
+    parts = [quote(str(value), safe='') for value in columns.values()] or [report]
+    return os.path.join(quote(report, safe=''), *parts[:-1], f'{parts[-1]}.parquet')
+
+
+def write_output(directory: str, path: str, df: pd.DataFrame) -> None:
+    atomic_write(os.path.join(directory, path),
+                 lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+def crawl(jobs: dict, directory: str, describe, max_workers: int = bulk.MAX_WORKERS,
+          typed: bool = False, retry_failed: bool = True, max_attempts: int = None,
+          progress: bool = True) -> dict:
+    '''
+    Runs the jobs of a crawl ({key: (transform function, url)}, as for
+    bulk.fetch_reports), recording each in the journal in directory, and
+    skipping those already done by an earlier run. Only failed jobs are
+    retried (if retry_failed, up to max_attempts times in all).
+
+    describe is passed each job's key, and returns the report name and the
+    columns to add, e.g. ('course_records', {'Country': 'Australia'}), as
+    for export.export_jobs. Keys must be strings, numbers or tuples of them.
+
+    Returns the exceptions of jobs which failed in this run, by key.
+
+    '''
+    os.makedirs(directory, exist_ok=True)
+    journal = Journal(os.path.join(directory, JOURNAL_FILE))
+    errors  = {}
+
+    try:
+        described = {key: describe(key) for key in jobs}
+        journal.plan(jobs, {key: report for key, (report, _) in described.items()})
+
+        todo    = {key: jobs[key] for key in journal.pending(retry_failed, max_attempts)
+                   if key in jobs}
+        tracker = Progress(len(todo)) if progress else None
+
+        for key, df, error in bulk.iter_reports(todo, max_workers, typed):
+            report, columns = described[key]
+            if error is None:
+                try:
+                    for position, (name, value) in enumerate(columns.items()):
+                        df.insert(position, name, value)
+
+                    path = output_path(report, columns)
+                    write_output(directory, path, df)
+                    journal.mark_done(key, path)
+                except Exception as e:
+                    error = e
+
+            if error is not None:
+                errors[key] = error
+                journal.mark_failed(key, error)
+
+            if tracker is not None:
+                label = ' '.join(str(value) for value in (report, *columns.values()))
+                tracker.update(label, 0 if df is None else len(df), error)
+    finally:
+        journal.close()
+
+    return errors
+
+
+def status(directory: str) -> dict:
+    '''
+    Returns the number of jobs of the crawl in directory, by status.
+
+    '''
+    journal = Journal(os.path.join(directory, JOURNAL_FILE))
+    try:
+        return journal.counts()
+    finally:
+        journal.close()
+
+
+def read(directory: str, report: str) -> pd.DataFrame:
+    '''
+    Returns every page of report done so far by the crawl in directory, in
+    one DataFrame, in the order they were planned.
+
+    '''
+    journal = Journal(os.path.join(directory, JOURNAL_FILE))
+    try:
+        entries = journal.entries(DONE, report)
+    finally:
+        journal.close()
+
+    frames = [pd.read_parquet(os.path.join(directory, entry.path)) for entry in entries]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def crawl_sweep(reports, directory: str, countries=None,
+                rate: float = DomainRateLimiter.RATE,
+                burst: float = DomainRateLimiter.BURST,
+                max_workers: int = sweep.MAX_WORKERS, typed: bool = False,
+                retry_failed: bool = True, max_attempts: int = None,
+                progress: bool = True) -> dict:
+    '''
+    Runs one or more country reports for each country, as sweep.sweep()
+    does, as a resumable crawl in directory (see crawl()).
+
+    Returns the exceptions of pages which failed in this run, keyed by
+    (report, country).
+
+    '''
+    if isinstance(reports, str):
+        reports = [reports]
+    if countries is None:
+        countries = list(scrape.get_countries())
+
+    jobs = sweep.sweep_jobs(reports, countries)
+
+    with sweep.rate_limited(rate, burst):
+        return crawl(jobs, directory, sweep.describe_sweep, max_workers, typed,
+                     retry_failed, max_attempts, progress)
+
+
+def crawl_locations(locations: list, directory: str, since: dict = None,
+                    rate: float = DomainRateLimiter.RATE,
+                    burst: float = DomainRateLimiter.BURST,
+                    max_workers: int = sweep.MAX_WORKERS, typed: bool = False,
+                    retry_failed: bool = True, max_attempts: int = None,
+                    progress: bool = True) -> dict:
+    '''
+    Retrieves the results of every event at each location (see
+    location.py) as a resumable crawl in directory (see crawl()), with
+    'Country', 'Location' and 'Event Number' columns added. since
+    optionally gives the last event wanted for each location, by
+    Location.key.
+
+    Event histories are fetched each run to plan the crawl; a location whose
+    history fails is left out of this run, and planned on the next.
+
+    Returns the exceptions of failed events, keyed by (Location.key, event
+    number), with failed event histories keyed by (Location.key, None).
+
+    '''
+    with sweep.rate_limited(rate, burst):
+        jobs, describe, errors = sweep.location_jobs(locations, since)
+        errors.update(crawl(jobs, directory, describe, max_workers, typed,
+                            retry_failed, max_attempts, progress))
+    return errors
@@ -0,0 +1,48 @@
+import importlib
+import threading
+
+#
+# This module defers heavy imports (pandas, numpy, bs4, requests) until
+# they're first used, so importing parkrun or country is quick and a run
+# which only needs one report only pays for what that report uses, e.g.
+#
+#   pd = lazy.module('pandas')
+#
+# in place of import pandas as pd. The module is imported on the first
+# attribute access (pd.DataFrame), after which its attributes are copied
+# across, so later accesses cost the same as for the module itself.
+#
+# Modules using this need `from __future__ import annotations`, so that
+# annotations such as -> pd.DataFrame aren't evaluated (and so don't import
+# pandas) when a function is defined.
+#
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+
+    def __init__(self, name: str) -> None:
+        self.__dict__['__lazy_name__'] = name
+
+    def __getattr__(self, attribute: str):
+        # Only called for attributes not copied across yet, i.e. before the import
+        with _lock:
+            if '__lazy_module__' not in self.__dict__:
+                module = importlib.import_module(self.__lazy_name__)
+                self.__dict__.update(module.__dict__)
+                self.__dict__['__lazy_module__'] = module
+        return getattr(self.__lazy_module__, attribute)
+
+    def __repr__(self) -> str:
+        loaded = '__lazy_module__' in self.__dict__
+        return f'<lazy module {self.__lazy_name__!r} ({"loaded" if loaded else "not loaded"})>'
+
+
+def module(name: str) -> LazyModule:
+    '''
+    Returns a stand-in for the module name, which imports it when first
+    used.
+
+    '''
+    return LazyModule(name)
@@ -1,3 +1,17 @@
+from   __future__ import annotations
+import json
+import os
+import threading
+import bulk
+import lazy
+import registry
+import scrape as gd
+import transform
+from   event import Event
+from   files import atomic_write
+
+pd = lazy.module('pandas')
+
 
 class Location:
 
@@ -14,6 +28,175 @@ class Location:
     # - Get sub 17 mens: https://www.parkrun.com.au/albertmelbourne/results/sub17men/
     # - Get age grade leaderboard: https://www.parkrun.com.au/albertmelbourne/results/agegradedleague/
     # - Get fastest 500: https://www.parkrun.com.au/albertmelbourne/results/fastest500/
-    
+    #
+    # Each of these is a report of the registry (see registry.py), available
+    # through get_report() and fetch_all(), as {name: (path, transform)}
+    #
+    REPORTS = registry.reports(registry.LOCATION)
+
+    # Paths of each page, relative to the location's url
+    LATEST_RESULTS       = registry.path_for('latest_results',       registry.LOCATION)
+    EVENT_HISTORY        = registry.path_for('event_history',        registry.LOCATION)
+    CLUB_LIST            = registry.path_for('club_list',            registry.LOCATION)
+    NOT_PARKRUN          = registry.path_for('not_parkrun',          registry.LOCATION)
+    NOT_PARKRUN_HISTORY  = registry.path_for('not_parkrun_history',  registry.LOCATION)
+    FIRST_FINISHES_COUNT = registry.path_for('first_finishes_count', registry.LOCATION)
+    AGE_CATEGORY_RECORDS = registry.path_for('age_category_records', registry.LOCATION)
+    SUB_TWENTY_WOMEN     = registry.path_for('sub_twenty_women',     registry.LOCATION)
+    SUB_SEVENTEEN_MEN    = registry.path_for('sub_seventeen_men',    registry.LOCATION)
+    AGE_GRADED_LEAGUE    = registry.path_for('age_graded_league',    registry.LOCATION)
+    FASTEST_500          = registry.path_for('fastest_500',          registry.LOCATION)
+
+    def __init__(self, country: str, name: str) -> None:
+        '''
+        country - name of the country, e.g. 'Australia'
+        name    - name of the location as used in its url, e.g. 'albertmelbourne'
+
+        '''
+        self.country = country
+        self.name    = name
+
+    @property
+    def url(self) -> str:
+        # Looked up when first used, so creating a Location doesn't touch the network
+        country_url, _ = gd.get_country_details(self.country)
+        return f'{country_url}{self.name}/'
+
+    @property
+    def key(self) -> str:
+        return f'{self.country}/{self.name}'
+
+    def get_latest_results(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('latest_results', registry.LOCATION, self.url, typed)
+
+    def get_event_history(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('event_history', registry.LOCATION, self.url, typed)
+
+    def get_report(self, name: str, typed: bool = False, columns: list = None) -> pd.DataFrame:
+        '''
+        Retrieves any page of the location by report name (see REPORTS),
+        optionally only the given columns. Pages without a transform yet
+        (e.g. 'club_list') are returned as untransformed tables.
+
+        '''
+        return registry.run(name, registry.LOCATION, self.url, typed, columns=columns)
+
+    def fetch_all(self, reports=None, max_workers: int = bulk.MAX_WORKERS,
+                  typed: bool = False) -> bulk.BulkResult:
+        '''
+        Retrieves several pages of the location concurrently, returning a
+        dictionary of report name (see REPORTS) to DataFrame. Defaults to
+        every page.
+
+        '''
+        return registry.fetch_all(reports, registry.LOCATION, self.url, max_workers, typed)
+
+    def get_event(self, event_no: int) -> Event:
+        return Event(self.country, self.name, event_no)
+
+    def get_event_results(self, event_no: int, typed: bool = False) -> pd.DataFrame:
+        return self.get_event(event_no).get_results(typed)
+
+    def get_new_events(self, since: int = None, limit: int = None) -> list:
+        '''
+        Returns the numbers of events held after event number since (all
+        events if since is None), oldest first. With a limit, only the
+        newest limit events are returned.
+
+        Only the event history page is retrieved.
+
+        '''
+        history = self.get_event_history()
+        numbers = sorted(n for n in history['Event Number'].dropna().astype(int)
+                         if since is None or n > since)
+        if limit is not None:
+            numbers = numbers[-limit:] if limit > 0 else []
+        return numbers
+
+    def get_new_event_results(self, since: int = None, limit: int = None,
+                              max_workers: int = bulk.MAX_WORKERS,
+                              typed: bool = False) -> bulk.BulkResult:
+        '''
+        Retrieves the results of every event held after event number since,
+        concurrently. Returns a dictionary of event number to DataFrame, with
+        failed events in the errors attribute of the result.
+
+        '''
+        jobs = {}
+        for event_no in self.get_new_events(since, limit):
+            jobs[event_no] = (transform.get_event_results, self.get_event(event_no).url)
+        return bulk.fetch_reports(jobs, max_workers, typed)
+
+    def update(self, state: 'IngestState', limit: int = None,
+               max_workers: int = bulk.MAX_WORKERS, typed: bool = False) -> pd.DataFrame:
+        '''
+        Incrementally retrieves results for this location: only events newer
+        than the last one ingested (according to state) are fetched, which
+        is usually just the event history page plus one or two events a
+        week. limit caps the number of events fetched when there is no
+        state yet (e.g. limit=1 for just the latest event).
+
+        Returns the new results with an 'Event Number' column, and records
+        the last event ingested in state. If an event fails, state is only
+        advanced to the event before it, so it is retried next time.
+
+        '''
+        since  = state.last_event(self.key)
+        result = self.get_new_event_results(since, limit if since is None else None,
+                                            max_workers, typed)
+
+        # Advance up to (not including) the first failed event
+        events = sorted(list(result) + list(result.errors))
+        done   = []
+        for event_no in events:
+            if event_no in result.errors:
+                break
+            done.append(event_no)
+
+        frames = []
+        for event_no in done:
+            df = result[event_no]
+            df.insert(0, 'Event Number', event_no)
+            frames.append(df)
+
+        if done:
+            state.set_last_event(self.key, done[-1])
+            state.save()
+
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+class IngestState:
+    '''
+    Records the last event number ingested for each location, in a JSON file,
+    so that Location.update() only fetches new events.
+
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path  = path
+        self._lock = threading.Lock()
+        self._last = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self._last = json.load(f)
+
+    def last_event(self, key: str) -> int:
+        with self._lock:
+            return self._last.get(key)
+
+    def set_last_event(self, key: str, event_no: int) -> None:
+        with self._lock:
+            self._last[key] = int(event_no)
+
+    def save(self) -> None:
+
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(self._last, f, indent=2)
 
-    pass
\ No newline at end of file
+        with self._lock:
+            atomic_write(self.path, write)
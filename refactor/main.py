@@ -1,21 +1,68 @@
+import logging
+import sys
 import parkrun
 import country
+import archive
+import cache
+import metrics
+import registry
+import scrape
+import store
+from   exceptions import ScrapeError
+
+ARCHIVE_PATH   = 'archive'
+CACHE_PATH     = 'cache/responses.sqlite'
+COUNTRIES_PATH = 'cache/countries.json'
+STORE_PATH     = 'store'
 
 
 def main():
 
+    # Pass --verbose to log each url retrieved (and each stage, see metrics.py)
+    logging.basicConfig(level=logging.DEBUG if '--verbose' in sys.argv else logging.WARNING)
+
+    # Reuse pages from previous runs (for as long as each report's ttl, see
+    # registry.py); pass --offline to avoid the network
+    cache.set_cache(cache.ResponseCache(CACHE_PATH, ttls=registry.ttls(),
+                                        offline='--offline' in sys.argv))
+    scrape.get_country_registry().path = COUNTRIES_PATH
+
+    # Keep every page fetched, so reports can be rebuilt later without rescraping
+    archive.set_archive(archive.Archive(ARCHIVE_PATH))
+
     # print(countries_dict['USA']['info'])
     pk = parkrun.Parkrun()
-    df = pk.get_largest_clubs()
+
+    # Pass --profile for a cProfile of one report
+    if '--profile' in sys.argv:
+        with metrics.profile():
+            df = pk.get_largest_clubs()
+    else:
+        df = pk.get_largest_clubs()
     print(df)
+
+    # Keep a snapshot of each report, for analysis across weeks
+    results = store.ResultStore(STORE_PATH)
+    results.append('largest_clubs', df)
     # df.to_csv("top_age_category.csv")
     # print(pk.get_runners_with_most_events())
 
     name = 'Australia'
     count = country.Country(name)
     # print(f"country url: {count.url}")
-    print(count.get_largest_clubs())
+    df = count.get_largest_clubs()
+    print(df)
+    results.append('largest_clubs', df, store.scope(name))
+    results.close()
+
+    # Pass --metrics for the time spent fetching, parsing and transforming
+    if '--metrics' in sys.argv:
+        print(metrics.get_metrics().to_prometheus())
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    try:
+        main()
+    except ScrapeError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,204 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from   collections import defaultdict
+from   contextlib import contextmanager
+
+#
+# This module records where the time goes in a run, by stage:
+#   - fetch     : scrape.get_response (network, cache or preloaded page)
+#   - parse     : reading a page's table into a DataFrame
+#   - transform : each transform.* function, end to end (so including the
+#                 fetch and parse of its page)
+#
+# along with counters: bytes and responses by source (network, cache,
+# revalidated, ...), HTTP status codes, retries, and rows read.
+#
+# Each stage is also logged as a structured (JSON) event to the
+# 'parkrun.metrics' logger, at DEBUG level, e.g.
+#
+#   logging.basicConfig(level=logging.DEBUG)
+#
+# and summary() / to_json() / to_prometheus() give the totals at the end of
+# a run. profile() captures a cProfile of any block, e.g. one report.
+#
+# Metrics are per process, so pages parsed in pipeline.py's worker
+# processes are not included.
+#
+
+logger = logging.getLogger('parkrun.metrics')
+
+PROMETHEUS_PREFIX = 'parkrun'
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics:
+
+    def __init__(self) -> None:
+        self._lock     = threading.Lock()
+        self._counters = defaultdict(float)
+        self._timings  = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        '''
+        Adds value to the counter name (with labels, e.g. code='503').
+
+        '''
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, stage: str, seconds: float, **labels) -> None:
+        '''
+        Records one run of stage (with labels) which took seconds.
+
+        '''
+        key = _key(stage, labels)
+        with self._lock:
+            count, total, longest = self._timings.get(key, (0, 0.0, 0.0))
+            self._timings[key]    = (count + 1, total + seconds, max(longest, seconds))
+
+    @contextmanager
+    def timed(self, stage: str, **labels):
+        '''
+        Times the block as a run of stage. Yields a dictionary to which the
+        block can add fields (e.g. url, rows) for the logged event.
+
+        '''
+        fields = {}
+        start  = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields['error'] = repr(e)
+            self.increment(f'{stage}_errors', **labels)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(stage, seconds, **labels)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({'stage': stage, **labels, 'seconds': round(seconds, 6),
+                                         **fields}, default=str))
+
+    def summary(self) -> dict:
+        with self._lock:
+            timings  = dict(self._timings)
+            counters = dict(self._counters)
+
+        return {
+            'timings'  : [{'stage': stage, **dict(labels), 'count': count,
+                           'seconds': total, 'max_seconds': longest}
+                          for (stage, labels), (count, total, longest) in sorted(timings.items())],
+            'counters' : [{'name': name, **dict(labels), 'value': value}
+                          for (name, labels), value in sorted(counters.items())],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self) -> str:
+        '''
+        Returns the totals in the Prometheus text format.
+
+        '''
+        def labelled(name, labels):
+            if not labels:
+                return name
+            text = ','.join(f'{label}="{value}"' for label, value in labels)
+            return f'{name}{{{text}}}'
+
+        with self._lock:
+            timings  = sorted(self._timings.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        for (stage, labels), (count, total, longest) in timings:
+            labels = (('stage', stage),) + labels
+            name   = f'{PROMETHEUS_PREFIX}_stage_seconds'
+            lines.append(f'{labelled(f"{name}_count", labels)} {count}')
+            lines.append(f'{labelled(f"{name}_sum", labels)} {total:.6f}')
+            lines.append(f'{labelled(f"{name}_max", labels)} {longest:.6f}')
+        for (name, labels), value in counters:
+            lines.append(f'{labelled(f"{PROMETHEUS_PREFIX}_{name}_total", labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+#
+# Process-wide metrics
+#
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def set_metrics(metrics: Metrics) -> None:
+    global _metrics
+    _metrics = metrics
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    _metrics.increment(name, value, **labels)
+
+
+def timed(stage: str, **labels):
+    return _metrics.timed(stage, **labels)
+
+
+def instrument(stage: str):
+    '''
+    Decorator which times each call of a function as a run of stage,
+    labelled with the function's name, and counts the rows of the
+    DataFrames it returns.
+
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(stage, function=function.__name__) as fields:
+                result = function(*args, **kwargs)
+                if hasattr(result, 'shape'):
+                    fields['rows'], fields['columns'] = result.shape
+                    increment(f'{stage}_rows', result.shape[0], function=function.__name__)
+            return result
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile(path: str = None, sort: str = 'cumulative', limit: int = 25):
+    '''
+    Captures a cProfile of the block, e.g. around a single report:
+
+      with metrics.profile():
+          pk.get_course_records()
+
+    The profile is saved to path (for pstats or snakeviz) if given, and
+    otherwise the top limit functions are printed.
+
+    '''
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+        else:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats(sort).print_stats(limit)
+            print(output.getvalue())
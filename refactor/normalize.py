@@ -0,0 +1,121 @@
+from   __future__ import annotations
+import lazy
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#
+# This module contains the normalisation steps shared by the report
+# functions in transform.py. Each works on a whole column at once, rather
+# than calling a Python function per row.
+#
+
+#
+# Milestone clubs, by the number of runs needed to join. Runners with fewer
+# than 25 runs, or 1000 or more, are not assigned a milestone.
+#
+MILESTONES     = [25, 50, 100, 250, 500]
+MILESTONE_BINS = MILESTONES + [1000]
+
+#
+# Age groups are in the form <category><gender><age range>, e.g. VM40-44,
+# SW25-29 or JM10, where the second letter gives the gender
+#
+AGE_GROUP_PATTERN = r'[A-Z]([A-Z])(\d+(?:-\d+)?)?'
+
+GENDERS = {
+    'M': 'Male',
+    'W': 'Female',
+    'F': 'Female',
+}
+UNKNOWN = 'Unknown'
+
+UNATTACHED = 'Unattached'
+
+
+def assign_milestones(total_runs: pd.Series) -> pd.Series:
+    '''
+    Returns the milestone club (25, 50, 100, 250 or 500) for each number of
+    runs, or NaN if there isn't one.
+
+    '''
+    milestones = pd.cut(total_runs, bins=MILESTONE_BINS, labels=MILESTONES, right=False)
+    return milestones.astype(float)
+
+
+def parse_age_groups(age_groups: pd.Series) -> pd.DataFrame:
+    '''
+    Splits age groups into 'Gender' ('Male', 'Female' or 'Unknown') and
+    'Age Range' (e.g. '40-44'), in a single pass over the column.
+
+    There are only a few dozen distinct age groups, so each distinct value
+    is parsed once and the results are spread back out by position.
+
+    '''
+    codes, uniques = pd.factorize(age_groups)
+    parts          = pd.Series(uniques, dtype=object).str.extract(AGE_GROUP_PATTERN)
+
+    gender    = parts[0].map(GENDERS).fillna(UNKNOWN).to_numpy(dtype=object)
+    age_range = parts[1].to_numpy(dtype=object)
+
+    # Missing age groups have a code of -1
+    missing = codes < 0
+    return pd.DataFrame({
+        'Gender'    : np.where(missing, UNKNOWN, gender.take(codes, mode='clip')),
+        'Age Range' : np.where(missing, np.nan, age_range.take(codes, mode='clip')),
+    }, index=age_groups.index)
+
+
+def clean_clubs(clubs: pd.Series) -> pd.Series:
+    '''
+    Blanks out 'Unattached', which is used in place of a club in the global
+    results.
+
+    '''
+    return clubs.str.replace(UNATTACHED, '', regex=False)
+
+
+def stack_pairs(df: pd.DataFrame, columns: list, genders: tuple) -> pd.DataFrame:
+    '''
+    Reshapes a table with one row per event and a pair of results side by
+    side, i.e. columns
+
+        Event, <first result columns>, <second result columns>
+
+    into a long table with one row per result, and a 'Gender' column giving
+    genders[0] for the first result and genders[1] for the second (or
+    'Unknown' where there is no athlete).
+
+    columns names the columns of one result, starting with 'Event' and
+    including 'Athlete Name'. Each event's two rows are kept next to each
+    other. Every output column is filled in a single pass, without slicing
+    or concatenating intermediate frames.
+
+    '''
+    width  = len(columns)
+    n_rows = len(df)
+
+    # A table with no rows has no columns either
+    if df.shape[1] == 0:
+        return pd.DataFrame({name: [] for name in columns + ['Gender']})
+
+    if df.shape[1] != 2 * width - 1:
+        raise ValueError(f'Expected {2 * width - 1} columns for paired results, '\
+                         f'but table has {df.shape[1]} columns')
+
+    data = {}
+    for i, name in enumerate(columns):
+
+        # The event is shared by both results
+        first  = df.iloc[:, i]
+        second = first if i == 0 else df.iloc[:, width - 1 + i]
+
+        values       = np.empty(2 * n_rows, dtype=object)
+        values[0::2] = first.to_numpy(dtype=object)
+        values[1::2] = second.to_numpy(dtype=object)
+        data[name]   = values
+
+    gender         = np.tile(np.array(genders, dtype=object), n_rows)
+    data['Gender'] = np.where(data['Athlete Name'] == '', UNKNOWN, gender)
+
+    return pd.DataFrame(data)
\ No newline at end of file
@@ -1,73 +1,89 @@
-import pandas as pd
+from   __future__ import annotations
+import bulk
+import lazy
+import registry
 import scrape
-import transform
+
+pd = lazy.module('pandas')
 
 class Parkrun:
     
     COUNTRIES_URL           = 'https://www.parkrun.com/countries/'
-    FIRST_FINISHERS_URL     = 'https://www.parkrun.com/results/firstfinishers/'
-    # NEW_AGE_CATEGORY_URL    = 'https://www.parkrun.com/results/newcategoryrecords/'
-    SUB_SEVENTEEN_URL       = 'https://www.parkrun.com/results/sub17/'
-    TOP_AGE_GRADE_URL       = 'https://www.parkrun.com/results/topagegrade/'
-    NEW_CAT_RECORDS_URL     = 'https://www.parkrun.com/results/newcatrecords/'
-    COURSE_RECORDS_URL      = 'https://www.parkrun.com/results/courserecords/'
-    FREEDOM_URL             = 'https://www.parkrun.com/results/freedom/'
-    ATTENDACE_RECORDS_URL   = 'https://www.parkrun.com/results/attendancerecords/'
-    MOST_EVENTS_URL         = 'https://www.parkrun.com/results/mostevents/'
-    MOST_FIRST_FINISHES_URL = 'https://www.parkrun.com/results/mostfirstfinishes/'
-    LARGEST_CLUBS_URL       = 'https://www.parkrun.com/results/largestclubs/'
 
-    def __init__(self) -> None:
+    # Urls of each report (see registry.py)
+    FIRST_FINISHERS_URL     = registry.url_for('first_finishers')
+    SUB_SEVENTEEN_URL       = registry.url_for('sub_seventeen_runners')
+    TOP_AGE_GRADE_URL       = registry.url_for('top_age_grade')
+    NEW_CAT_RECORDS_URL     = registry.url_for('new_category_records')
+    COURSE_RECORDS_URL      = registry.url_for('course_records')
+    FREEDOM_URL             = registry.url_for('freedom_finishers')
+    ATTENDACE_RECORDS_URL   = registry.url_for('attendance_records')
+    MOST_EVENTS_URL         = registry.url_for('most_events_attended')
+    MOST_FIRST_FINISHES_URL = registry.url_for('most_first_finishes')
+    LARGEST_CLUBS_URL       = registry.url_for('largest_clubs')
+
+    #
+    # Reports available through fetch_all(), as {name: (url, transform)}
+    # (see registry.py)
+    #
+    REPORTS = registry.reports(registry.GLOBAL, registry.GLOBAL_URL)
 
-        self.countries = scrape.get_countries()
-        pass
+    @property
+    def countries(self) -> dict:
+        '''
+        Dictionary of parkrun countries (see scrape.get_countries), which
+        is only retrieved when first used.
+
+        '''
+        return scrape.get_countries()
     
-    def get_first_finishers(self) -> pd.DataFrame:
-        url = Parkrun.FIRST_FINISHERS_URL
-        df  = transform.get_first_finishers(url)
-        return df
+    def get_first_finishers(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('first_finishers', typed=typed)
     
-    def get_sub_seventeen_runners(self) -> pd.DataFrame:
-        url = Parkrun.SUB_SEVENTEEN_URL
-        df  = transform.get_sub_seventeen_runners(url)
-        return df
+    def get_sub_seventeen_runners(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('sub_seventeen_runners', typed=typed)
     
-    def get_top_age_grade(self) -> pd.DataFrame:
-        url = Parkrun.TOP_AGE_GRADE_URL
-        df  = transform.get_top_age_grade(url)
-        return df
+    def get_top_age_grade(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('top_age_grade', typed=typed)
     
-    def get_new_category_records(self) -> pd.DataFrame:
-        url = Parkrun.NEW_CAT_RECORDS_URL
-        df  = transform.get_new_category_records(url) 
-        return df
+    def get_new_category_records(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('new_category_records', typed=typed)
 
-    def get_course_records(self) -> pd.DataFrame:
-        url = Parkrun.COURSE_RECORDS_URL
-        df  = transform.get_course_records(url) 
-        return df
+    def get_course_records(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('course_records', typed=typed)
     
-    def get_freedom_finishers(self) -> pd.DataFrame:
-        url = Parkrun.FREEDOM_URL
-        df  = transform.get_freedom_finishers(url)
-        return df
+    def get_freedom_finishers(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('freedom_finishers', typed=typed)
     
-    def get_attendance_records(self) -> pd.DataFrame:
-        url = Parkrun.ATTENDACE_RECORDS_URL
-        df  = transform.get_attendance_records(url)
-        return df
+    def get_attendance_records(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('attendance_records', typed=typed)
     
-    def get_most_events_attended(self) -> pd.DataFrame:
-        url = Parkrun.MOST_EVENTS_URL
-        df  = transform.get_most_events_attended(url)
-        return df
+    def get_most_events_attended(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('most_events_attended', typed=typed)
     
-    def get_most_first_finishes(self) -> pd.DataFrame:
-        url = Parkrun.MOST_FIRST_FINISHES_URL
-        df  = transform.get_most_first_finishes(url)
-        return df
+    def get_most_first_finishes(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('most_first_finishes', typed=typed)
     
-    def get_largest_clubs(self) -> pd.DataFrame:
-        url = Parkrun.LARGEST_CLUBS_URL
-        df  = transform.get_largest_clubs(url)
-        return df
+    def get_largest_clubs(self, typed: bool = False) -> pd.DataFrame:
+        return registry.run('largest_clubs', typed=typed)
+
+    def get_report(self, name: str, typed: bool = False, columns: list = None) -> pd.DataFrame:
+        '''
+        Retrieves any global report by name (see registry.py), optionally
+        only the given columns.
+
+        '''
+        return registry.run(name, registry.GLOBAL, registry.GLOBAL_URL, typed, columns=columns)
+
+    def fetch_all(self, reports=None, max_workers: int = bulk.MAX_WORKERS,
+                  typed: bool = False) -> bulk.BulkResult:
+        '''
+        Retrieves several reports concurrently, returning a dictionary of
+        report name (see REPORTS) to DataFrame. Defaults to every report.
+
+        Reports which fail are left out, and their exceptions are available
+        from the errors attribute of the result. With typed=True, columns have
+        native dtypes (see transform.py).
+
+        '''
+        return registry.fetch_all(reports, registry.GLOBAL, registry.GLOBAL_URL, max_workers, typed)
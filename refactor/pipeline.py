@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import threading
+from   concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import bulk
+import scrape
+
+#
+# This module runs many reports as a two stage pipeline, for crawls large
+# enough that parsing, rather than the network, is the bottleneck.
+#
+# With bulk.fetch_reports, pages are fetched concurrently on threads, but
+# every page is then parsed on the same core, as parsing holds the GIL.
+# Here, threads only fetch pages (through the shared client, cache and rate
+# limiter, as usual), and the raw bytes of each page are sent to a pool of
+# processes, which run the report's transform (and so get_html_table) on
+# every core. Only the finished DataFrames come back.
+#
+# At most max_pending pages are held at once, fetched but not yet parsed:
+# fetch threads wait for parsing to catch up rather than piling up pages in
+# memory.
+#
+# Usage:
+#
+#   jobs   = registry.jobs(None)    # every global report
+#   result = pipeline.run(jobs, parse_workers=16)
+#
+# As workers are started fresh rather than forked, a script using this
+# must guard its entry point with if __name__ == '__main__'.
+#
+
+FETCH_WORKERS = bulk.MAX_WORKERS
+
+#
+# Worker processes are started by a fork server rather than forked from this
+# process: the first worker is started from a fetch thread, and a process
+# forked while another thread holds a lock (the cache's, metrics', or an
+# import lock) would deadlock on it
+#
+START_METHOD = 'forkserver'
+
+
+def parse_page(function, url: str, body: bytes, encoding: str, typed: bool = False):
+    '''
+    Runs a transform function on a page which has already been retrieved.
+    Runs in a worker process.
+
+    '''
+    with scrape.preloaded({url: (body, encoding)}):
+        return function(url, typed)
+
+
+def run(jobs: dict, fetch_workers: int = FETCH_WORKERS, parse_workers: int = None,
+        max_pending: int = None, typed: bool = False) -> bulk.BulkResult:
+    '''
+    Runs each job, where jobs is a dictionary of
+    {report name: (transform function, url)}, as for bulk.fetch_reports, but
+    with transforms run in parse_workers processes (defaults to the number
+    of cores). max_pending bounds the number of pages waiting to be parsed,
+    and defaults to twice parse_workers.
+
+    Returns a dictionary of report name to DataFrame, with failed reports in
+    the errors attribute of the result.
+
+    '''
+    result = bulk.BulkResult()
+    if not jobs:
+        return result
+
+    parse_workers = parse_workers or os.cpu_count() or 1
+    pending       = threading.BoundedSemaphore(max_pending or 2 * parse_workers)
+
+    context = multiprocessing.get_context(START_METHOD)
+
+    with ProcessPoolExecutor(max_workers=min(parse_workers, len(jobs)),
+                             mp_context=context) as parse_pool, \
+         ThreadPoolExecutor(max_workers=min(fetch_workers, len(jobs))) as fetch_pool:
+
+        def fetch(function, url):
+            # Wait for room before fetching, so no more than max_pending pages are held
+            pending.acquire()
+            try:
+                response = scrape.get_response(url)
+                future   = parse_pool.submit(parse_page, function, url, response.content,
+                                             response.encoding, typed)
+            except BaseException:
+                pending.release()
+                raise
+
+            future.add_done_callback(lambda _: pending.release())
+            return future
+
+        fetches = {fetch_pool.submit(fetch, function, url): name
+                   for name, (function, url) in jobs.items()}
+
+        parses = {}
+        for future in as_completed(fetches):
+            name = fetches[future]
+            try:
+                parses[future.result()] = name
+            except Exception as e:
+                result.errors[name] = e
+
+        for future in as_completed(parses):
+            name = parses[future]
+            try:
+                result[name] = future.result()
+            except Exception as e:
+                result.errors[name] = e
+
+    return result
@@ -0,0 +1,102 @@
+import threading
+import time
+from   urllib.parse import urlsplit
+
+#
+# This module contains rate limiters used to avoid hammering any one parkrun
+# site when requests are made concurrently.
+#
+# Each domain (parkrun.com.au, parkrun.org.uk, parkrun.jp, ...) gets its own
+# token bucket, so requests to different countries run in parallel while
+# requests to the same country are spaced out. When a domain responds with a
+# 503 or 429, it is paused for the backoff period, so every thread waits
+# rather than just the one which received the response.
+#
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        '''
+        rate     - tokens added per second
+        capacity - maximum number of tokens held, i.e. the largest burst
+
+        '''
+        self.rate     = rate
+        self.capacity = capacity
+
+        self._tokens       = capacity
+        self._updated      = time.monotonic()
+        self._paused_until = 0.0
+        self._lock         = threading.Lock()
+
+    def acquire(self) -> None:
+        '''
+        Takes a token, blocking until one is available.
+
+        '''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        '''
+        Stops any tokens being taken for the given number of seconds.
+
+        '''
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens       = 0
+            self._updated      = self._paused_until
+
+    def _refill(self, now: float) -> None:
+        elapsed       = max(0.0, now - self._updated)
+        self._tokens  = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+
+class DomainRateLimiter:
+
+    #
+    # Defaults, i.e. on average one request per second to each domain, with
+    # bursts of up to two
+    #
+    RATE  = 1.0
+    BURST = 2
+
+    def __init__(self, rate: float = RATE, burst: float = BURST) -> None:
+        self.rate  = rate
+        self.burst = burst
+
+        self._buckets = {}
+        self._lock    = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        domain = urlsplit(url).netloc
+        with self._lock:
+            if domain not in self._buckets:
+                self._buckets[domain] = TokenBucket(self.rate, self.burst)
+            return self._buckets[domain]
+
+    def acquire(self, url: str) -> None:
+        '''
+        Blocks until a request may be made to the domain of url.
+
+        '''
+        self.bucket(url).acquire()
+
+    def penalise(self, url: str, seconds: float) -> None:
+        '''
+        Pauses all requests to the domain of url, e.g. after a 503.
+
+        '''
+        self.bucket(url).pause(seconds)
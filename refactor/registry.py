@@ -0,0 +1,231 @@
+from   __future__ import annotations
+from   collections import namedtuple
+import bulk
+import cache
+import transform
+
+#
+# This module is the registry of every report: where its page is, at which
+# scopes it's available, the columns it returns, the transform which builds
+# it and how long its page stays fresh in the cache. Parkrun, Country and
+# Location run their reports through run() and jobs() here, rather than each
+# building urls themselves.
+#
+# Scopes are:
+#   - global   : https://www.parkrun.com/results/courserecords/
+#   - country  : https://www.parkrun.com.au/results/courserecords
+#   - location : https://www.parkrun.com.au/albertmelbourne/results/eventhistory
+#
+# A report's path (and columns) may differ between scopes, in which case
+# they're given as a dictionary by scope, e.g. new category records.
+#
+# Dtypes aren't part of a spec: with typed=True, each transform converts its
+# columns by name from schema.TYPED_COLUMNS (see schema.py).
+#
+# Usage:
+#
+#   df     = registry.run('course_records', registry.COUNTRY, Country('Australia').url)
+#   result = registry.fetch_all(['course_records', 'largest_clubs'])
+#
+# Pages of locations other than the latest results and event history have
+# no transform yet, and are returned as untransformed (numbered) tables.
+#
+
+GLOBAL   = 'global'
+COUNTRY  = 'country'
+LOCATION = 'location'
+SCOPES   = (GLOBAL, COUNTRY, LOCATION)
+
+GLOBAL_URL = 'https://www.parkrun.com/'
+
+ReportSpec = namedtuple('ReportSpec', ['name', 'paths', 'transform', 'columns', 'ttl'],
+                        defaults=[None, cache.DAY])
+
+# Columns of each report, as built by its transform (see transform.py)
+FIRST_FINISHERS_COLS = transform.FIRST_FINISHERS_COLS
+SUB_SEVENTEEN_COLS   = transform.SUB_SEVENTEEN_COLS
+AGE_GRADE_COLS       = transform.AGE_GRADE_COLS
+COURSE_RECORDS_COLS  = transform.COURSE_RECORDS_COLS
+FREEDOM_COLS         = transform.FREEDOM_COLS
+ATTENDANCE_COLS      = transform.ATTENDANCE_COLS
+MOST_EVENTS_COLS     = {
+    GLOBAL  : transform.MOST_EVENTS_GLOBAL_COLS,
+    COUNTRY : transform.MOST_EVENTS_COUNTRY_COLS,
+}
+MOST_FIRST_COLS      = transform.MOST_FIRST_COLS
+LARGEST_CLUBS_COLS   = transform.LARGEST_CLUBS_COLS
+NOT_PARKRUN_COLS     = transform.NOT_PARKRUN_COLS
+
+
+def _global_and_country(path: str) -> dict:
+    # Global pages have a trailing slash, country pages don't
+    return {GLOBAL: f'{path}/', COUNTRY: path}
+
+
+SPECS = {spec.name: spec for spec in [
+    #
+    # Global and country reports
+    #
+    ReportSpec('first_finishers',       _global_and_country('results/firstfinishers'),
+               transform.get_first_finishers,       FIRST_FINISHERS_COLS),
+    ReportSpec('sub_seventeen_runners', _global_and_country('results/sub17'),
+               transform.get_sub_seventeen_runners, SUB_SEVENTEEN_COLS),
+    ReportSpec('top_age_grade',         _global_and_country('results/topagegrade'),
+               transform.get_top_age_grade,         AGE_GRADE_COLS),
+    ReportSpec('new_category_records',  {GLOBAL  : 'results/newcatrecords/',
+                                         COUNTRY : 'results/newcategoryrecords'},
+               transform.get_new_category_records,  AGE_GRADE_COLS),
+    ReportSpec('course_records',        _global_and_country('results/courserecords'),
+               transform.get_course_records,        COURSE_RECORDS_COLS),
+    ReportSpec('freedom_finishers',     _global_and_country('results/freedom'),
+               transform.get_freedom_finishers,     FREEDOM_COLS),
+    ReportSpec('attendance_records',    _global_and_country('results/attendancerecords'),
+               transform.get_attendance_records,    ATTENDANCE_COLS),
+    ReportSpec('most_events_attended',  _global_and_country('results/mostevents'),
+               transform.get_most_events_attended,  MOST_EVENTS_COLS),
+    ReportSpec('most_first_finishes',   _global_and_country('results/mostfirstfinishes'),
+               transform.get_most_first_finishes,   MOST_FIRST_COLS),
+    ReportSpec('largest_clubs',         _global_and_country('results/largestclubs'),
+               transform.get_largest_clubs,         LARGEST_CLUBS_COLS),
+
+    #
+    # Country only reports
+    #
+    ReportSpec('not_parkrunners',       {COUNTRY: 'results/notparkrun'},
+               transform.get_not_parkrunners,       NOT_PARKRUN_COLS),
+    ReportSpec('hundred_clubbers',      {COUNTRY: 'results/100clubbers'},
+               transform.get_raw_table),
+
+    #
+    # Location reports
+    #
+    ReportSpec('latest_results',        {LOCATION: 'results/latestresults'},
+               transform.get_event_results,         transform.EVENT_RESULTS_COLS, 12 * cache.HOUR),
+    ReportSpec('event_history',         {LOCATION: 'results/eventhistory'},
+               transform.get_event_history,         transform.EVENT_HISTORY_COLS, 12 * cache.HOUR),
+    ReportSpec('club_list',             {LOCATION: 'results/clublist'},            transform.get_raw_table),
+    ReportSpec('not_parkrun',           {LOCATION: 'results/notparkrun'},          transform.get_raw_table),
+    ReportSpec('not_parkrun_history',   {LOCATION: 'results/notparkrunhistory'},   transform.get_raw_table),
+    ReportSpec('first_finishes_count',  {LOCATION: 'results/firstfinishescount'},  transform.get_raw_table),
+    ReportSpec('age_category_records',  {LOCATION: 'results/agecategoryrecords'},  transform.get_raw_table),
+    ReportSpec('sub_twenty_women',      {LOCATION: 'results/sub20women'},          transform.get_raw_table),
+    ReportSpec('sub_seventeen_men',     {LOCATION: 'results/sub17men'},            transform.get_raw_table),
+    ReportSpec('age_graded_league',     {LOCATION: 'results/agegradedleague'},     transform.get_raw_table),
+    ReportSpec('fastest_500',           {LOCATION: 'results/fastest500'},          transform.get_raw_table),
+]}
+
+
+def get_spec(name: str) -> ReportSpec:
+    if name not in SPECS:
+        raise ValueError(f'Unknown report = {name}, expected one of {list(SPECS)}')
+    return SPECS[name]
+
+
+def names(scope: str) -> list:
+    '''
+    Returns the names of the reports available at scope.
+
+    '''
+    if scope not in SCOPES:
+        raise ValueError(f'Unknown scope = {scope}, expected one of {SCOPES}')
+    return [spec.name for spec in SPECS.values() if scope in spec.paths]
+
+
+def path_for(name: str, scope: str) -> str:
+    spec = get_spec(name)
+    if scope not in spec.paths:
+        raise ValueError(f'Report {name} is not available at scope = {scope}, '
+                         f'only at {list(spec.paths)}')
+    return spec.paths[scope]
+
+
+def url_for(name: str, scope: str = GLOBAL, base_url: str = GLOBAL_URL) -> str:
+    '''
+    Returns the url of a report, where base_url is that of the site (for
+    global reports), the country (e.g. Country.url) or the location (e.g.
+    Location.url).
+
+    '''
+    return f'{base_url}{path_for(name, scope)}'
+
+
+def columns_for(name: str, scope: str = GLOBAL) -> list:
+    '''
+    Returns the columns of a report at scope, or None for untransformed
+    tables (whose columns are numbered).
+
+    '''
+    columns = get_spec(name).columns
+    if isinstance(columns, dict):
+        return columns.get(scope)
+    return columns
+
+
+def reports(scope: str, base_url: str = '') -> dict:
+    '''
+    Returns the reports available at scope as {name: (url, transform)},
+    with urls relative to base_url.
+
+    '''
+    return {name: (url_for(name, scope, base_url), get_spec(name).transform)
+            for name in names(scope)}
+
+
+def jobs(reports, scope: str = GLOBAL, base_url: str = GLOBAL_URL) -> dict:
+    '''
+    Returns the jobs to run reports (names, defaulting to every report at
+    scope) as {name: (transform function, url)}, for bulk.fetch_reports or
+    pipeline.run.
+
+    '''
+    reports = names(scope) if reports is None else reports
+    return {name: (get_spec(name).transform, url_for(name, scope, base_url))
+            for name in reports}
+
+
+def run(name: str, scope: str = GLOBAL, base_url: str = GLOBAL_URL, typed: bool = False,
+        time_dtype: str = 'seconds', columns: list = None):
+    '''
+    Runs a report at scope, where base_url is that of the site, country or
+    location. With typed=True, columns have native dtypes (see
+    transform.py), and columns optionally selects the columns returned.
+
+    '''
+    spec = get_spec(name)
+    url  = url_for(name, scope, base_url)
+
+    # Check the columns asked for before anything is fetched
+    known = columns_for(name, scope)
+    if columns is not None and known is not None:
+        unknown = [column for column in columns if column not in known]
+        if unknown:
+            raise ValueError(f'Unknown columns = {unknown} for report {name}, expected any of {known}')
+
+    df = spec.transform(url, typed, time_dtype)
+    return df if columns is None else df[columns]
+
+
+def fetch_all(reports=None, scope: str = GLOBAL, base_url: str = GLOBAL_URL,
+              max_workers: int = bulk.MAX_WORKERS, typed: bool = False) -> bulk.BulkResult:
+    '''
+    Runs several reports at scope concurrently (see bulk.fetch_reports),
+    defaulting to every report available there.
+
+    '''
+    return bulk.fetch_reports(jobs(reports, scope, base_url), max_workers, typed)
+
+
+def ttls() -> list:
+    '''
+    Returns the cache time-to-live of each report's page, as patterns for
+    cache.ResponseCache, followed by the defaults in cache.TTLS.
+
+    '''
+    patterns = {}
+    for spec in SPECS.values():
+        for path in spec.paths.values():
+            patterns.setdefault(path.rstrip('/'), spec.ttl)
+
+    # Longest first, so e.g. results/notparkrunhistory is matched before results/notparkrun
+    ordered = sorted(patterns.items(), key=lambda item: len(item[0]), reverse=True)
+    return ordered + cache.TTLS
@@ -0,0 +1,220 @@
+from   __future__ import annotations
+from   collections import namedtuple
+import lazy
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#
+# This module contains column schemas, which describe the columns of a table
+# (their names and target dtypes), and the converters used to build each
+# column with its final dtype.
+#
+# Supported dtypes:
+#   - str       : text, as read from the page
+#   - int       : whole numbers, in the smallest integer type that fits
+#                 (nullable Int64 if any value is missing)
+#   - float     : decimal numbers, as float32
+#   - percent   : decimal numbers followed by '%', e.g. age grades, as float32
+#   - seconds   : times such as '17:01' or '1:02:03', as whole seconds
+#   - timedelta : times such as '17:01' or '1:02:03', as timedelta64
+#   - date      : dates in the form dd/mm/yyyy, as datetime64
+#   - category  : text with few distinct values, e.g. events or clubs
+#
+# transform.py can return typed results, where each column gets the dtype
+# listed for it in TYPED_COLUMNS.
+#
+
+Column = namedtuple('Column', ['name', 'dtype'], defaults=['str'])
+
+
+def columns(*specs) -> list:
+    '''
+    Returns a schema from column names and/or (name, dtype) pairs.
+
+    '''
+    return [Column(spec) if isinstance(spec, str) else Column(*spec) for spec in specs]
+
+
+def to_numbers(values) -> pd.Series:
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+
+    series = series.astype(object).astype(str)
+    series = series.str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(series, errors='coerce')
+
+
+def to_int(values) -> pd.Series:
+    series = to_numbers(values)
+    if not series.isna().any():
+        return pd.to_numeric(series, downcast='integer')
+
+    # Use the smallest nullable integer type which fits
+    low, high = series.min(), series.max()
+    for dtype in ('Int8', 'Int16', 'Int32'):
+        info = np.iinfo(dtype.lower())
+        if pd.isna(low) or (info.min <= low and high <= info.max):
+            return series.astype(dtype)
+    return series.astype('Int64')
+
+
+def to_float(values) -> pd.Series:
+    return to_numbers(values).astype(np.float32)
+
+
+def to_percent(values) -> pd.Series:
+    series = pd.Series(values, dtype=object).astype(str).str.rstrip('% ')
+    return to_float(series)
+
+
+def to_seconds(values) -> pd.Series:
+    '''
+    Converts times in the form [[h:]m]:s to whole seconds, in one vectorized
+    pass. Values which aren't times become <NA>.
+
+    '''
+    series = pd.Series(values, dtype=object).astype(str).str.strip()
+    parts  = series.str.extract(r'^(?:(\d+):)?(\d+):(\d{2})$').astype(float)
+
+    seconds = parts[0].fillna(0) * 3600 + parts[1] * 60 + parts[2]
+    return seconds.astype('Int32')
+
+
+def to_timedelta(values) -> pd.Series:
+    return pd.to_timedelta(to_seconds(values).astype(float), unit='s')
+
+
+def to_date(values) -> pd.Series:
+    series = pd.Series(values, dtype=object).astype(str).str.strip()
+    return pd.to_datetime(series, format='%d/%m/%Y', errors='coerce')
+
+
+def to_category(values) -> pd.Series:
+    return pd.Series(values).astype('category')
+
+
+CONVERTERS = {
+    'str'       : None,
+    'int'       : to_int,
+    'float'     : to_float,
+    'percent'   : to_percent,
+    'seconds'   : to_seconds,
+    'timedelta' : to_timedelta,
+    'date'      : to_date,
+    'category'  : to_category,
+}
+
+
+def convert(values, dtype: str):
+    '''
+    Converts a column of values to dtype (see CONVERTERS).
+
+    '''
+    if dtype not in CONVERTERS:
+        raise ValueError(f'Unknown dtype = {dtype}, expected one of {list(CONVERTERS)}')
+
+    converter = CONVERTERS[dtype]
+    if converter is None:
+        return values
+
+    series = converter(values)
+    return series.array if isinstance(series, pd.Series) else series
+
+
+#
+# Dtypes for the columns returned by transform.py, used when typed results
+# are asked for. Times use the time dtype asked for ('seconds' or
+# 'timedelta') in place of 'time'.
+#
+TYPED_COLUMNS = {
+    'Event'                               : 'category',
+    'Club'                                : 'category',
+    'Gender'                              : 'category',
+    'Age Group'                           : 'category',
+    'Age Range'                           : 'category',
+    'Location'                            : 'category',
+    'Time'                                : 'time',
+    'Average Time'                        : 'time',
+    'Age Grade'                           : 'percent',
+    'Date'                                : 'date',
+    'Record Week'                         : 'date',
+    'Record Attendance'                   : 'int',
+    'This Week'                           : 'int',
+    'No. Athletes'                        : 'int',
+    'No. Runs'                            : 'int',
+    'Total No. Runs'                      : 'int',
+    'No. First Place Finishes'            : 'int',
+    'No. Unique Events (Global)'          : 'int',
+    'No. Unique Events (in Home Country)' : 'int',
+    'Total Parkruns (in Home Country)'    : 'int',
+    'Total Runs Worldwide'                : 'int',
+    'Parkrun Club'                        : 'int',
+    'Position'                            : 'int',
+    'Finishers'                           : 'int',
+    'Volunteers'                          : 'int',
+}
+
+TIME_DTYPES = ('seconds', 'timedelta')
+
+
+def typed_dtype(name: str, time_dtype: str = 'seconds') -> str:
+    '''
+    Returns the dtype for a column of a typed result (see TYPED_COLUMNS).
+
+    '''
+    if time_dtype not in TIME_DTYPES:
+        raise ValueError(f'Unknown time dtype = {time_dtype}, expected one of {TIME_DTYPES}')
+
+    dtype = TYPED_COLUMNS.get(name, 'str')
+    return time_dtype if dtype == 'time' else dtype
+
+
+def typed_columns(names: list, time_dtype: str = 'seconds') -> list:
+    '''
+    Returns a schema for the given column names, with the dtypes used for
+    typed results.
+
+    '''
+    return [Column(name, typed_dtype(name, time_dtype)) for name in names]
+
+
+def apply_dtypes(df: pd.DataFrame, time_dtype: str = 'seconds') -> pd.DataFrame:
+    '''
+    Converts the columns of a result to the dtypes used for typed results.
+
+    '''
+    for name in df.columns:
+        dtype = typed_dtype(name, time_dtype)
+        if dtype != 'str':
+            df[name] = convert(df[name], dtype)
+    return df
+
+
+def build_frame(buffers: list, schema: list = None) -> pd.DataFrame:
+    '''
+    Builds a DataFrame from per-column lists of values. If a schema is given
+    (Columns, names or (name, dtype) pairs), it must have one entry per
+    column, and each column is named and converted as it is added, so the
+    frame is only built once.
+
+    '''
+    if schema is None:
+        return pd.DataFrame(dict(enumerate(buffers)))
+
+    schema = columns(*schema)
+
+    # A table with no rows has no columns either
+    if not buffers:
+        buffers = [[] for _ in schema]
+
+    if len(schema) != len(buffers):
+        raise ValueError(f'Schema has {len(schema)} columns, '\
+                         f'but table has {len(buffers)} columns')
+
+    data = {}
+    for column, values in zip(schema, buffers):
+        data[column.name] = convert(values, column.dtype)
+
+    return pd.DataFrame(data)
@@ -1,11 +1,19 @@
-from   bs4 import BeautifulSoup
-import pandas as pd
-import requests
-import sys
-import difflib
-import traceback
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from   __future__ import annotations
+import io
+import logging
+import time
+from   contextlib import contextmanager
+import lazy
+from   client import get_client, SUCCESS
+import archive as page_archive
+import cache as response_cache
+import metrics
+from   country_registry import CountryRegistry
+from   schema import build_frame
+from   exceptions import ScrapeError, ParseError, CacheMissError, ArchiveMissError
+
+bs4 = lazy.module('bs4')
+pd  = lazy.module('pandas')
 
 
 #
@@ -14,39 +22,118 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 # Would likely need to import the translate module. 
 #
 
-HEADERS    = {'user-agent': 'Chrome/43.0.2357'}
-SUCCESS    = 200
-NO_SERVICE = 503
-
 COUNTRIES_URL = 'https://www.parkrun.com/countries/'
+NOT_MODIFIED  = 304
 
-def get_response(url: str) -> bytes:
-    try:
-        print(f'Getting data from url = {url}')
-        # Run a request to the url
-        response = requests.get(url, headers=HEADERS, verify=False)
+# Each url retrieved from the network is logged at DEBUG level
+logger = logging.getLogger('parkrun.scrape')
 
-        if response.status_code == NO_SERVICE:
-            raise ValueError(f'Service unavailable for url = {url}')
+# Pages already retrieved elsewhere (e.g. by the pipeline's fetch stage), by url
+_preloaded = {}
 
-        # Raise exceptions for invalid response
-        if response.status_code != SUCCESS:
-            raise ValueError(f'Invalid response.\n'\
-                             f'Response code = {response.status_code}, URL = {url}')
-    
-    except Exception as e:
-        print(f'ERROR: {e}')
-        sys.exit(1)
-    
+@contextmanager
+def preloaded(pages: dict):
+    '''
+    Serves the given pages, as {url: (body bytes, encoding)}, from
+    get_response() within the block, rather than retrieving them. Used to
+    run transforms on pages fetched in another process (see pipeline.py).
+
+    '''
+    _preloaded.update(pages)
+    try:
+        yield
+    finally:
+        for url in pages:
+            _preloaded.pop(url, None)
+
+def get_response(url: str):
+    '''
+    Retrieves a url using the shared (pooled, retrying) client.
+
+    If a response cache has been set (see cache.set_cache), fresh entries are
+    served from it, and stale entries are revalidated with a conditional
+    request. In offline mode only the cache is used.
+
+    If an archive has been set (see archive.set_archive), every page
+    retrieved from the network is added to it, and while replaying the
+    archive (see archive.replay) pages are served only from it.
+
+    Raises a FetchError (or subclass) if the url cannot be retrieved.
+
+    The time taken, size and source of each response are recorded (see
+    metrics.py).
+
+    '''
+    with metrics.timed('fetch') as fields:
+        fields['url']    = url
+        response, source = _get_response(url)
+        fields['source'] = source
+        fields['bytes']  = len(response.content)
+
+    metrics.increment('fetch_responses', source=source)
+    metrics.increment('fetch_bytes', len(response.content), source=source)
+
+    # Keep every page fetched (revalidated pages were fetched too, just not downloaded)
+    archive = page_archive.get_archive()
+    if archive is not None and source in ('network', 'revalidated'):
+        archive.put(url, response.content, response.encoding)
     return response
 
+def _get_response(url: str) -> tuple:
+    '''
+    Returns the response for a url, and where it came from: 'preloaded',
+    'archive', 'cache', 'revalidated' (cached, and unchanged) or 'network'.
+
+    '''
+    if url in _preloaded:
+        body, encoding = _preloaded[url]
+        entry          = response_cache.CacheEntry(url, body, time.time(), None, None, encoding)
+        return response_cache.to_response(entry), 'preloaded'
+
+    replaying, as_of = page_archive.replaying()
+    if replaying:
+        entry = page_archive.get_archive().get(url, as_of)
+        if entry is None:
+            raise ArchiveMissError(f'No archived response for url = {url} (as of {as_of})', url)
+        return response_cache.to_response(entry), 'archive'
+
+    cache = response_cache.get_cache()
+    if cache is None:
+        logger.debug('Getting data from url = %s', url)
+        return get_client().get(url), 'network'
+
+    entry = cache.get(url)
+    if entry is not None and (cache.offline or cache.is_fresh(entry)):
+        return response_cache.to_response(entry), 'cache'
+
+    if cache.offline:
+        raise CacheMissError(f'No cached response for url = {url} (offline)', url)
+
+    logger.debug('Getting data from url = %s', url)
+    if entry is None:
+        response = get_client().get(url)
+    else:
+        response = get_client().get(url, headers=response_cache.validators(entry),
+                                    ok_statuses=(SUCCESS, NOT_MODIFIED))
+
+    # Page is unchanged since it was cached
+    if response.status_code == NOT_MODIFIED:
+        cache.touch(url, response)
+        return response_cache.to_response(entry), 'revalidated'
+
+    cache.put(url, response)
+    return response, 'network'
+
 def get_html_tables(url: str) -> pd.DataFrame:
     try:
         # Get content from provided url
         response = get_response(url)
         
         # Parse content for any html tables
-        html_tables = pd.read_html(response.content, keep_default_na=False)
+        # (pandas treats a literal string as a path, so wrap it in a buffer)
+        with metrics.timed('parse', parser='read_html') as fields:
+            fields['url'] = url
+            html_tables   = pd.read_html(io.StringIO(response.text), keep_default_na=False)
 
         # Verify that table data exists and that there's only one
         if html_tables == None or len(html_tables) != 1:
@@ -68,138 +155,244 @@ def get_html_tables(url: str) -> pd.DataFrame:
         else:
             raise ValueError(f'Dataframe generated from url = {url} is empty.')
 
+    except ScrapeError:
+        raise
     except Exception as e:
-        traceback.print_exc() 
-        sys.exit(1)
+        raise ParseError(f'Unable to read tables from url = {url}: {e}') from e
     return df
 
 
-# def extract_athlete_info(url):
-#     try:
-#         url = 'https://www.parkrun.com.au/parkrunner/1114599'
-#         response  = get_response(url)
-#         soup      = BeautifulSoup(response.text, 'html.parser')
-#         paragraphs = soup.find_all('p')
-#         print(paragraphs)
+def get_html_table(url: str, parser: str = None, schema: list = None,
+                   usecols: list = None, stop=None, links: bool = False) -> pd.DataFrame:
+    '''
+    Retrieves a url and returns the first table on the page as a DataFrame.
 
-#         pattern = re.compile(r'[A-Za-z]+\d{2}-\d{2}|[A-Za-z]+\d{2}')
-        
-#         # Athlete age group
-#         match = re.search(pattern, paragraphs)
-#         matches = [re.search(pattern, paragraph) for paragraph in paragraphs if paragraph]
-#         print(matches)
-#         sys.exit()
-        
-#         if match:
-#             pattern = re.compile(r'([A-Z]+)(\d{2}(?:-\d{2})?)')
-#             age_group = str(match.group(0))
-
-#             match = re.match(pattern, age_group)
-#             if match:
-#                 gender = match.group(1)
-#                 if gender or gender == '':
-#                     # Extract the last field
-#                     gender = gender[-1]
-#                     gender = 'Male' if gender == 'M' else 'Female'
-#                 else:
-#                     gender = 'Unknown'
-#                 age_range = match.group(2)
-#                 print(f'gender: {gender}, age_range: {gender}, age_group: {age_group}')
-#                 return gender, age_range
-
-#     except Exception as e:
-#         traceback.print_exc() 
-#         # print(f'extract_athlete_info() ERROR: {e}')
-
-
-def get_html_table(url: str) -> pd.DataFrame:
+    parser selects the backend used to read the table (see PARSERS), and
+    defaults to the module-wide setting (see set_parser).
+
+    schema optionally names each column and gives its dtype (see schema.py).
+    Without one, columns are numbered and hold text.
+
+    usecols optionally lists the (0-based) columns to keep, and stop is an
+    optional function which is passed each row (of kept columns), and returns
+    True at the first row not to keep. With links=True, each row passed to
+    stop also has a links attribute, the hrefs of every link in the row. See
+    parse_html_table.
+
+    '''
     try:
-        data = []
-        
         # Get response from url
         response = get_response(url)
 
-        # Parse the HTML content of the webpage
-        soup = BeautifulSoup(response.text, 'html.parser')
+        parser = parser or _parser
+        with metrics.timed('parse', parser=parser) as fields:
+            fields['url'] = url
+            df            = parse_html_table(response.text, parser, schema, usecols, stop, links)
+            fields['rows'], fields['columns'] = df.shape
 
-        # Get table from url (first table)
-        # table = soup.find('table', {'class': ['results', 'sortable']})
-        table = soup.find('table')
+        metrics.increment('parse_rows', len(df), parser=parser)
+        return df
 
-        # Verify that table data was able to be extracted
-        if not table:
-            raise ValueError("Unable to find table data for "\
-                             "class = 'result' or class = 'sortable'")
+    except ScrapeError:
+        raise
+    except Exception as e:
+        raise ParseError(f'Unable to read table from url = {url}: {e}') from e
 
-        # Add rows to data, prepending id generated from url
-        for tr in table.find_all('tr'):
-            row_list = []
+def parse_html_table(html: str, parser: str = None, schema: list = None,
+                     usecols: list = None, stop=None, links: bool = False) -> pd.DataFrame:
+    '''
+    Returns the first table in html as a DataFrame, with one column per cell
+    (spacer cells are ignored). Where a cell links to an athlete, the Athlete
+    ID is added as a column before the cell's text.
 
-            # Ignore the spacer column
-            for table_data in tr.find_all('td', class_=lambda x: x != 'bspacer'):
-                
-                #
-                # If data contains a link, process it. It may contain Athlete ID
-                #
-                if table_data.a:
-                    data_url = table_data.a['href']
-                    if 'athleteNumber' in str(data_url):
-                        id = data_url.split('=')[-1]
-                        row_list.append(id)
-                    if 'parkrunner' in str(data_url):
-                        id = data_url.split('/')[-1]
-                        row_list.append(id)
+    Values are added straight to per-column buffers, which are converted to
+    their final dtypes (if a schema is given) as the DataFrame is built.
+
+    Columns not in usecols are never extracted, and no rows are read after
+    the row for which stop returns True, so both save parsing time as well as
+    memory. A schema, if given, describes the kept columns.
+
+    With links=True, rows are TableRows, so stop can also look at the hrefs
+    of the row's links (which aren't columns), e.g. to stop at a section
+    heading which links to a given page.
+
+    '''
+    keep = None if usecols is None else frozenset(usecols)
+    rows = PARSERS[parser or _parser](html, keep, links)
+
+    buffers = []
+    n_rows  = 0
+    for row_list in rows:
+        #
+        # Do not add any blank rows
+        #
+        if all(val == '' for val in row_list):
+                continue
+
+        if stop is not None and stop(row_list):
+            break
+
+        # Start a new column, blank for earlier rows, if this row is wider
+        while len(buffers) < len(row_list):
+            buffers.append([None] * n_rows)
+
+        for buffer, val in zip(buffers, row_list):
+            buffer.append(val)
+
+        # Pad any columns this row is too short for
+        for buffer in buffers[len(row_list):]:
+            buffer.append(None)
+
+        n_rows += 1
+
+    return build_frame(buffers, schema)
+
+def set_parser(parser: str) -> None:
+    '''
+    Sets the backend used by get_html_table, i.e. 'bs4' or 'lxml'.
+
+    '''
+    global _parser
+    if parser not in PARSERS:
+        raise ValueError(f'Unknown parser = {parser}, expected one of {list(PARSERS)}')
+    _parser = parser
+
+def _keep(keep: frozenset, position: int) -> bool:
+    return keep is None or position in keep
+
+def _link_ids(data_url) -> list:
+    '''
+    Returns any Athlete IDs in a link within a table cell.
+
+    '''
+    ids = []
+    if 'athleteNumber' in str(data_url):
+        ids.append(data_url.split('=')[-1])
+    if 'parkrunner' in str(data_url):
+        ids.append(data_url.split('/')[-1])
+    return ids
+
+class TableRow(list):
+    '''
+    The values of a table row, along with the hrefs of every link in it.
+
+    '''
+
+    def __init__(self, values=(), links=()) -> None:
+        super().__init__(values)
+        self.links = list(links)
 
-                    # Add url column (for locations)
-                    # if str(data_url).split('/')[-1] == 'results':
-                    #     row_list.append(data_url)
-                
-                # Add literal text value to the row
-                val = table_data.text
-                row_list.append(val)
+def _table_rows_bs4(html: str, keep: frozenset = None, links: bool = False):
+    '''
+    Yields the rows of the first table in html, using BeautifulSoup. Only
+    columns whose positions are in keep (if given) are extracted. With
+    links, rows are TableRows.
+
+    '''
+    # Parse the HTML content of the webpage
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+
+    # Get table from url (first table)
+    # table = soup.find('table', {'class': ['results', 'sortable']})
+    table = soup.find('table')
+
+    # Verify that table data was able to be extracted
+    if not table:
+        raise ValueError("Unable to find table data for "\
+                         "class = 'result' or class = 'sortable'")
+
+    # Add rows to data, prepending id generated from url
+    for tr in table.find_all('tr'):
+        row_list = TableRow() if links else []
+        position = 0
+
+        # Ignore the spacer column
+        for table_data in tr.find_all('td', class_=lambda x: x != 'bspacer'):
             
             #
-            # Do not add any blank rows
+            # If data contains a link, process it. It may contain Athlete ID
             #
-            if all(val == '' for val in row_list):
-                    continue
+            if table_data.a:
+                if links:
+                    row_list.links.extend(a.get('href', '') for a in table_data.find_all('a'))
+
+                for id in _link_ids(table_data.a['href']):
+                    if _keep(keep, position):
+                        row_list.append(id)
+                    position += 1
+
+                # Add url column (for locations)
+                # if str(data_url).split('/')[-1] == 'results':
+                #     row_list.append(data_url)
             
-            data.append(row_list)
-        
-        df = pd.DataFrame(data)
-        return df
-    
-    except Exception as e:
-        print(f'get_html_table() ERROR: {e}')
-        traceback.print_exc() 
-        sys.exit(1)
+            # Add literal text value to the row
+            if _keep(keep, position):
+                row_list.append(table_data.text)
+            position += 1
+
+        yield row_list
+
+def _table_rows_lxml(html: str, keep: frozenset = None, links: bool = False):
+    '''
+    Yields the rows of the first table in html, using lxml. This is several
+    times faster than BeautifulSoup's html.parser on large tables, and gives
+    the same rows. Only columns whose positions are in keep (if given) are
+    extracted. With links, rows are TableRows.
+
+    '''
+    import lxml.html
+
+    root  = lxml.html.fromstring(html)
+    table = next(root.iter('table'), None)
+
+    # Verify that table data was able to be extracted
+    if table is None:
+        raise ValueError("Unable to find table data for "\
+                         "class = 'result' or class = 'sortable'")
+
+    for tr in table.iter('tr'):
+        row_list = TableRow() if links else []
+        position = 0
+        for table_data in tr.iter('td'):
+
+            # Ignore the spacer column
+            if table_data.get('class', '').split() == ['bspacer']:
+                continue
+
+            # If data contains a link, it may contain Athlete ID
+            link = next(table_data.iter('a'), None)
+            if link is not None:
+                if links:
+                    row_list.links.extend(a.get('href', '') for a in table_data.iter('a'))
+
+                for id in _link_ids(link.get('href', '')):
+                    if _keep(keep, position):
+                        row_list.append(id)
+                    position += 1
+
+            if _keep(keep, position):
+                row_list.append(table_data.text_content())
+            position += 1
+
+        yield row_list
+
+#
+# Backends for reading tables, by name
+#
+PARSERS = {
+    'bs4'  : _table_rows_bs4,
+    'lxml' : _table_rows_lxml,
+}
+
+_parser = 'bs4'
 
 def get_country_details(name):
-    # Get countries 
-    countries      = get_countries()
-    countries_list = list(countries.keys())
-
-    # Assign country name to closest match (if possible)
-    c_name = name \
-        if name in countries_list \
-        else difflib.get_close_matches(name, countries_list)[0]
-    
-    if not c_name:
-        raise KeyError(f'Unable to find {name} in {countries}')
-    
-    info = countries[c_name]['info']
-    url  = countries[c_name]['url']
+    '''
+    Returns the url and info for the country closest to name, using the
+    shared country registry.
 
-    if not url:
-            raise KeyError(f'Unable to find url for {name} in {countries}')
-    if not info:
-            raise KeyError(f'Unable to find info for {name} in {countries}')
-    
-    # Add a forward slash if it's not at the end the generated url
-    if url[-1] != '/':
-        url = f'{url}/'
-    
-    return url, info
+    '''
+    return _country_registry.details(name)
 
 def get_locations(name):
     try:
@@ -220,21 +413,34 @@ def get_locations(name):
         # Create a dictionary of events and their urls
         locations = dict(zip(df['Event'], df['Event URL']))
 
+    except ScrapeError:
+        raise
     except Exception as e:
-        print(f'ERROR: {e}')
-        sys.exit(1)
+        raise ParseError(f'Unable to get locations for {name}: {e}') from e
     return locations
 
-def get_countries():
+def get_countries() -> dict:
+    '''
+    Returns a dictionary of all countries, in the form
+    {name: {'info': ..., 'url': ...}}. The countries page is only downloaded
+    the first time this is called (see get_country_registry).
+
+    '''
+    return _country_registry.countries()
+
+def get_country_registry() -> CountryRegistry:
+    return _country_registry
+
+def fetch_countries() -> dict:
     """
-    This function reads 
+    This function reads the countries page and returns its countries.
     """
     try:
 
         response = get_response(COUNTRIES_URL)
 
         # Parse the HTML content of the webpage
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = bs4.BeautifulSoup(response.text, 'html.parser')
 
         # Find all the divs with the class 'section-wrap'
         country_sections = soup.find_all('div', class_='section-wrap')
@@ -249,8 +455,14 @@ def get_countries():
             # Add info and url for each country to dictionary
             countries[name] = {'info': info, 'url': url}
     
+    except ScrapeError:
+        raise
     except Exception as e:
-        print(f'ERROR: {e}')
-        sys.exit(1)
+        raise ParseError(f'Unable to read countries from url = {COUNTRIES_URL}: {e}') from e
     
-    return countries
\ No newline at end of file
+    return countries
+
+#
+# Process-wide country registry, loaded on first use
+#
+_country_registry = CountryRegistry(fetch_countries)
@@ -0,0 +1,233 @@
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from   collections import namedtuple
+from   urllib.parse import quote
+import pandas as pd
+from   files import atomic_write
+
+#
+# This module contains a persistent store of scraped reports, so that trends
+# can be analysed across weeks without rescraping (which can't recover past
+# weeks anyway).
+#
+# Each report is stored as a snapshot, keyed by report name, scope and
+# snapshot date. Snapshot data is written as Parquet (columnar, compressed,
+# and keeps dtypes) under partitioned directories:
+#
+#   <root>/report=<report>/scope=<scope>/date=<yyyy-mm-dd>/<content hash>.parquet
+#
+# and a SQLite catalog records every snapshot, so the latest snapshot or a
+# date range can be found without listing directories. If a report hasn't
+# changed since an earlier snapshot (same content hash), its data isn't
+# written again; the new snapshot refers to the existing file.
+#
+# Scopes are 'global', or built with scope() for a country or location,
+# e.g. 'country:Australia' or 'location:Australia:albertmelbourne'.
+#
+# Parquet support needs pyarrow (or fastparquet) to be installed.
+#
+
+GLOBAL = 'global'
+
+Snapshot = namedtuple('Snapshot', ['report', 'scope', 'snapshot_date', 'content_hash',
+                                   'rows', 'path'])
+
+
+def scope(country: str = None, location: str = None) -> str:
+    '''
+    Returns the scope key for global, country or location results.
+
+    '''
+    if location is not None:
+        return f'location:{country}:{location}'
+    if country is not None:
+        return f'country:{country}'
+    return GLOBAL
+
+
+def content_hash(df: pd.DataFrame) -> str:
+    '''
+    Returns a hash of a DataFrame's columns, dtypes and values (not its
+    index), so identical reports hash the same.
+
+    '''
+    digest = hashlib.sha256()
+    digest.update(repr([(str(name), str(dtype)) for name, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def iso_date(value) -> str:
+    if value is None:
+        return datetime.date.today().isoformat()
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value).isoformat()
+    return value.isoformat()[:10]
+
+
+class ResultStore:
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db   = sqlite3.connect(os.path.join(root, 'catalog.sqlite'),
+                                     check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                report        TEXT NOT NULL,
+                scope         TEXT NOT NULL,
+                snapshot_date TEXT NOT NULL,
+                content_hash  TEXT NOT NULL,
+                rows          INTEGER NOT NULL,
+                path          TEXT NOT NULL,
+                created_at    REAL NOT NULL,
+                PRIMARY KEY (report, scope, snapshot_date)
+            )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS snapshots_hash '
+                         'ON snapshots (report, scope, content_hash)')
+        self._db.commit()
+
+    def append(self, report: str, df: pd.DataFrame, scope: str = GLOBAL,
+               snapshot_date=None) -> Snapshot:
+        '''
+        Stores df as the snapshot of report for scope on snapshot_date
+        (defaults to today), replacing any snapshot already stored for that
+        date (and removing its file, if no other snapshot refers to it).
+        Data identical to an earlier snapshot is not written again.
+
+        '''
+        snapshot_date = iso_date(snapshot_date)
+        digest        = content_hash(df)
+
+        with self._lock:
+            row = self._db.execute('SELECT path FROM snapshots WHERE report = ? AND scope = ? '
+                                   'AND content_hash = ? LIMIT 1',
+                                   (report, scope, digest)).fetchone()
+
+        if row is not None and os.path.exists(os.path.join(self.root, row[0])):
+            path = row[0]
+        else:
+            path = self._write(report, scope, snapshot_date, digest, df)
+
+        snapshot = Snapshot(report, scope, snapshot_date, digest, len(df), path)
+        with self._lock:
+            replaced = self._db.execute('SELECT path FROM snapshots WHERE report = ? AND scope = ? '
+                                        'AND snapshot_date = ?',
+                                        (report, scope, snapshot_date)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (*snapshot, time.time()))
+            self._db.commit()
+
+            # Remove the replaced snapshot's file, unless another snapshot shares it
+            if replaced is not None and replaced[0] != path:
+                shared = self._db.execute('SELECT 1 FROM snapshots WHERE path = ? LIMIT 1',
+                                          replaced).fetchone()
+                if shared is None:
+                    self._remove(replaced[0])
+        return snapshot
+
+    def snapshots(self, report: str = None, scope: str = None,
+                  start=None, end=None) -> pd.DataFrame:
+        '''
+        Returns the catalog of snapshots (optionally for one report and/or
+        scope, between start and end dates inclusive), oldest first.
+
+        '''
+        query, params = self._where(report, scope, start, end)
+        with self._lock:
+            rows = self._db.execute(f'SELECT report, scope, snapshot_date, content_hash, rows, path '
+                                    f'FROM snapshots {query} ORDER BY snapshot_date, report, scope',
+                                    params).fetchall()
+        return pd.DataFrame(rows, columns=Snapshot._fields)
+
+    def latest(self, report: str, scope: str = GLOBAL) -> pd.DataFrame:
+        '''
+        Returns the most recent snapshot of report for scope, or None if
+        there isn't one.
+
+        '''
+        with self._lock:
+            row = self._db.execute('SELECT path FROM snapshots WHERE report = ? AND scope = ? '
+                                   'ORDER BY snapshot_date DESC LIMIT 1',
+                                   (report, scope)).fetchone()
+        if row is None:
+            return None
+        return self._read(row[0])
+
+    def snapshot(self, report: str, scope: str = GLOBAL, snapshot_date=None) -> pd.DataFrame:
+        '''
+        Returns the snapshot of report for scope on snapshot_date (the latest
+        if None), or None if there isn't one.
+
+        '''
+        if snapshot_date is None:
+            return self.latest(report, scope)
+
+        with self._lock:
+            row = self._db.execute('SELECT path FROM snapshots WHERE report = ? AND scope = ? '
+                                   'AND snapshot_date = ?',
+                                   (report, scope, iso_date(snapshot_date))).fetchone()
+        if row is None:
+            return None
+        return self._read(row[0])
+
+    def read(self, report: str, scope: str = GLOBAL, start=None, end=None) -> pd.DataFrame:
+        '''
+        Returns every snapshot of report for scope between start and end
+        dates (inclusive) in one DataFrame, with a 'Snapshot Date' column.
+
+        '''
+        catalog = self.snapshots(report, scope, start, end)
+
+        frames = []
+        for snapshot_date, path in zip(catalog['snapshot_date'], catalog['path']):
+            df = self._read(path)
+            df.insert(0, 'Snapshot Date', pd.Timestamp(snapshot_date))
+            frames.append(df)
+
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _write(self, report: str, scope: str, snapshot_date: str, digest: str,
+               df: pd.DataFrame) -> str:
+        directory = os.path.join(f'report={quote(report, safe="")}',
+                                 f'scope={quote(scope, safe="")}',
+                                 f'date={snapshot_date}')
+        path = os.path.join(directory, f'{digest[:16]}.parquet')
+
+        atomic_write(os.path.join(self.root, path),
+                     lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        return path
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(os.path.join(self.root, path))
+        except FileNotFoundError:
+            pass
+
+    def _read(self, path: str) -> pd.DataFrame:
+        return pd.read_parquet(os.path.join(self.root, path))
+
+    def _where(self, report, scope, start, end) -> tuple:
+        conditions = []
+        params     = []
+        for column, operator, value in (('report', '=', report), ('scope', '=', scope),
+                                        ('snapshot_date', '>=', start),
+                                        ('snapshot_date', '<=', end)):
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                params.append(iso_date(value) if column == 'snapshot_date' else value)
+
+        query = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        return query, params
@@ -0,0 +1,172 @@
+from   collections import defaultdict
+from   contextlib import contextmanager
+from   itertools import zip_longest
+from   urllib.parse import urlsplit
+import pandas as pd
+import bulk
+import pipeline
+import scrape
+import transform
+from   client import get_client
+from   country import Country
+from   ratelimit import DomainRateLimiter
+
+#
+# This module contains the sweep engine, which runs country reports for
+# every country and combines the results.
+#
+# Requests to the different country sites are made concurrently (up to
+# max_workers at once), while each site is rate limited on its own (see
+# ratelimit.py), and backs off when it responds with a 503 or 429.
+#
+# For large sweeps, parse_workers moves parsing onto a pool of processes
+# (see pipeline.py), so it isn't limited to one core.
+#
+
+MAX_WORKERS = 8
+
+
+def schedule(tasks: list) -> list:
+    '''
+    Orders (country, report, url) tasks so that consecutive tasks go to
+    different domains where possible, i.e. one task for each domain in turn.
+    This keeps workers busy on other sites rather than all queueing for the
+    same site's rate limit.
+
+    '''
+    by_domain = defaultdict(list)
+    for task in tasks:
+        by_domain[urlsplit(task[2]).netloc].append(task)
+
+    return [task
+            for tasks in zip_longest(*by_domain.values())
+            for task in tasks if task is not None]
+
+
+def sweep_jobs(reports: list, countries: list) -> dict:
+    '''
+    Returns the jobs to run each report for each country, as
+    {(report, country): (transform function, url)} (see bulk.fetch_reports),
+    in the order given by schedule().
+
+    '''
+    tasks = []
+    for name in countries:
+        url = Country(name).url
+        for report in reports:
+            path, _ = Country.REPORTS[report]
+            tasks.append((name, report, f'{url}{path}'))
+
+    jobs = {}
+    for name, report, url in schedule(tasks):
+        _, function         = Country.REPORTS[report]
+        jobs[(report, name)] = (function, url)
+    return jobs
+
+
+def describe_sweep(key) -> tuple:
+    '''
+    Returns the report name and the columns to add for a job of
+    sweep_jobs(), e.g. ('course_records', {'Country': 'Australia'}).
+
+    '''
+    report, name = key
+    return report, {'Country': name}
+
+
+def location_jobs(locations: list, since: dict = None) -> tuple:
+    '''
+    Returns the jobs to retrieve the results of every event at each
+    location after since (the last event wanted, by Location.key), as
+    {(Location.key, event number): (transform function, url)}, along with
+    a describe function for them (as describe_sweep) and the exceptions of
+    event histories which couldn't be fetched, keyed by (Location.key, None).
+
+    '''
+    since  = since or {}
+    jobs   = {}
+    errors = {}
+    by_key = {location.key: location for location in locations}
+
+    for location in locations:
+        try:
+            events = location.get_new_events(since.get(location.key))
+        except Exception as e:
+            errors[(location.key, None)] = e
+            continue
+
+        for event_no in events:
+            jobs[(location.key, int(event_no))] = (transform.get_event_results,
+                                                   location.get_event(event_no).url)
+
+    def describe(key):
+        location = by_key[key[0]]
+        return 'event_results', {'Country'      : location.country,
+                                 'Location'     : location.name,
+                                 'Event Number' : key[1]}
+
+    return jobs, describe, errors
+
+
+@contextmanager
+def rate_limited(rate: float = DomainRateLimiter.RATE, burst: float = DomainRateLimiter.BURST):
+    '''
+    Installs a per-domain rate limiter on the shared client within the block,
+    unless one has been set up already.
+
+    '''
+    client   = get_client()
+    previous = client.limiter
+    if previous is None:
+        client.limiter = DomainRateLimiter(rate, burst)
+    try:
+        yield client.limiter
+    finally:
+        client.limiter = previous
+
+
+def sweep(reports, countries=None,
+          rate: float = DomainRateLimiter.RATE,
+          burst: float = DomainRateLimiter.BURST,
+          max_workers: int = MAX_WORKERS,
+          typed: bool = False,
+          parse_workers: int = None) -> bulk.BulkResult:
+    '''
+    Runs one or more country reports (names from Country.REPORTS, e.g.
+    'course_records') for each country, defaulting to every country in
+    scrape.get_countries().
+
+    Returns a dictionary of report name to a single DataFrame for all
+    countries, with a 'Country' column added. Countries which fail are left
+    out, and their exceptions are available from the errors attribute of the
+    result, keyed by (report, country). With typed=True, columns have native
+    dtypes (see transform.py).
+
+    With parse_workers, pages are parsed in that many processes while
+    max_workers threads fetch them (see pipeline.run).
+
+    '''
+    if isinstance(reports, str):
+        reports = [reports]
+    if countries is None:
+        countries = list(scrape.get_countries())
+
+    jobs = sweep_jobs(reports, countries)
+
+    with rate_limited(rate, burst):
+        if parse_workers is None:
+            frames = bulk.fetch_reports(jobs, max_workers, typed)
+        else:
+            frames = pipeline.run(jobs, max_workers, parse_workers, typed=typed)
+
+    result        = bulk.BulkResult()
+    result.errors = frames.errors
+    for (report, name), df in frames.items():
+        df.insert(0, 'Country', name)
+
+    # Combine in the order the countries were given
+    for report in reports:
+        dfs = [frames[(report, name)] for name in countries if (report, name) in frames]
+        if dfs:
+            result[report] = pd.concat(dfs, ignore_index=True)
+    return result
@@ -1,5 +1,6 @@
-import pandas as pd
-import numpy as np
+import metrics
+import normalize
+import schema
 from scrape import get_html_table
 
 #
@@ -14,45 +15,68 @@ from scrape import get_html_table
 #   - get_sub_seventeen_runners() : Retrieves athletes who've finished in less than 17 mins
 #   - get_top_age_grade()         : Retrieves atheletes with highest age categories
 #   - get_new_category_records()  : 
+#   - get_age_grade_records()     : Shared by get_top_age_grade() and get_new_category_records()
 #   - get_course_records()        : Retrieves 
 #   - get_freedom_finishers()     :
 #   - get_attendance_records()    :
 #   - get_most_events()           : Retrieves athletes with most events attendend
 #   - get_most_first_finishes()   : Retrieves atheletes with most first place finishes
 #   - get_largest_clubs()         : Retrieves clubs with largest number of atheletes
+#   - get_event_history()         : Retrieves every event held at a location
+#   - get_event_results()         : Retrieves the results of a single event at a location
+#   - get_raw_table()             : Retrieves any other page as an untransformed table
+#
+# Each function returns text columns by default. With typed=True, columns are
+# converted to native dtypes instead (see schema.TYPED_COLUMNS), e.g. times
+# as whole seconds (or timedelta64, with time_dtype='timedelta'), age grades
+# as float32, dates as datetime64, counts as compact integers and events,
+# clubs, genders and age groups as categoricals.
 #
 ###################################################################################################
 
 FIRST_FINISHERS_COLS = ['Event', 'Athlete ID', 'Athlete Name', 'Gender', 'Club']
 
-def get_first_finishers(url):
+NOT_PARKRUN_COLS = ['Location', 'No. Athletes', 'Total No. Runs', 'Average Time']
 
-    # 
-    # Getting data from url = https://www.parkrun.org.uk/results/firstfinishers
-    # process.py:44: SettingWithCopyWarning: 
-    # A value is trying to be set on a copy of a slice from a DataFrame.
-    # Try using .loc[row_indexer,col_indexer] = value instead
-    #
+# First row of the country section of the (not)parkrun table
+NOT_PARKRUN_COUNTRIES_MARKER = 'https://www.parkrun.com.au/results/notparkrun'
 
-    df = get_html_table(url)
+def is_not_parkrun_countries(row):
+    '''
+    Whether a row of the (not)parkrun table (with links) is the first of its
+    country section, i.e. links to NOT_PARKRUN_COUNTRIES_MARKER.
+
+    '''
+    return len(row) > 1 and any(link.rstrip('/') == NOT_PARKRUN_COUNTRIES_MARKER
+                                for link in row.links)
+
+def table_schema(names, typed=False, time_dtype='seconds'):
+    '''
+    Returns the schema to read a table with, so that simple reports are
+    built with their final column names and dtypes in one go.
+
+    '''
+    return schema.typed_columns(names, time_dtype) if typed else names
 
-    # Assign names to columns
-    columns = ['Event', 'Athlete ID', 'Athlete Name', 'Club']
+def finish(df, typed=False, time_dtype='seconds'):
+    '''
+    Converts a report to native dtypes, if asked for.
 
-    # Split df into two
-    df1 = df.iloc[:, :4]
-    df2 = df.drop(df.columns[1:4], axis=1)
+    '''
+    return schema.apply_dtypes(df, time_dtype) if typed else df
 
-    # Assign column names to split dfs
-    df1.columns = columns
-    df2.columns = columns
+@metrics.instrument('transform')
+def get_first_finishers(url, typed=False, time_dtype='seconds'):
 
-    # Assign unknown if athlete name is blank, otherwise assign gender
-    df1['Gender'] = np.where(df1['Athlete Name'] == '', 'Unknown', 'Male')
-    df2['Gender'] = np.where(df2['Athlete Name'] == '', 'Unknown', 'Female')
+    df = get_html_table(url)
 
-    # Concatenate both dataframes together
-    df = pd.concat([df1, df2])
+    #
+    # Each row has the male then female first finisher for an event, so
+    # reshape to one row per finisher, with the male and female finishers for
+    # an event next to each other
+    #
+    df = normalize.stack_pairs(df, ['Event', 'Athlete ID', 'Athlete Name', 'Club'],
+                               ('Male', 'Female'))
 
     # Reorder columns
     df = df[FIRST_FINISHERS_COLS]
@@ -61,118 +85,101 @@ def get_first_finishers(url):
     # Replace any Unattached values with blanks. This occurs in the global
     # parkrun results
     #
-    df['Club'] = df['Club'].str.replace('Unattached', '')
-    return df
+    df['Club'] = normalize.clean_clubs(df['Club'])
+    return finish(df, typed, time_dtype)
 
 
-def get_sub_seventeen_runners(url):
-    df = get_html_table(url)
+SUB_SEVENTEEN_COLS = ['Event', 'Athlete ID', 'Athlete Name', 'Time', 'Club']
 
-    df.columns = ['Event', 'Athlete ID', 'Athlete Name', 'Time', 'Club']
+@metrics.instrument('transform')
+def get_sub_seventeen_runners(url, typed=False, time_dtype='seconds'):
+    df = get_html_table(url, schema=SUB_SEVENTEEN_COLS)
 
-    df['Club'] = df['Club'].str.replace('Unattached', '')
+    df['Club'] = normalize.clean_clubs(df['Club'])
 
-    return df
+    return finish(df, typed, time_dtype)
 
-def get_top_age_grade(url):
-    df = get_html_table(url)
+AGE_GRADE_COLS = ['Event', 'Athlete ID', 'Athlete Name', 'Gender', 
+                  'Age Range', 'Age Group', 'Age Grade', 'Time', 'Club']
 
-    df.columns = ['Event', 'Athlete ID', 'Athlete Name', 'Time', 
-                  'Age Group', 'Age Grade', 'Club']
-    
-    col_reorder = ['Event', 'Athlete ID', 'Athlete Name', 'Gender', 
-                   'Age Range', 'Age Group', 'Age Grade', 'Time', 'Club']
-    
-    df['Age Range'] = df['Age Group'].str.extract(r'(\d+-\d+|\d+)')
-    df['Gender']    = df['Age Group'].str.extract(r'([A-Z]{2})').apply(lambda x: x.str[-1])
-    
-    df['Gender'] = df['Gender'].replace('', 'Unknown')
-
-    df['Gender'] = np.where(df['Gender'] == 'M', 'Male', 'Female')
-
-    df['Club'] = df['Club'].str.replace('Unattached', '')
-
-    # Reorder columns
-    df = df[col_reorder]
+@metrics.instrument('transform')
+def get_top_age_grade(url, typed=False, time_dtype='seconds'):
+    return get_age_grade_records(url, typed, time_dtype)
 
-    return df
 
+@metrics.instrument('transform')
+def get_new_category_records(url, typed=False, time_dtype='seconds'):
+    return get_age_grade_records(url, typed, time_dtype)
 
-def get_new_category_records(url):
 
-    df = get_html_table(url)
+def get_age_grade_records(url, typed=False, time_dtype='seconds'):
+    '''
+    Retrieves a table of athletes with their age group and age grade, as
+    used by both the top age grade and new category records reports.
 
-    df.columns = ['Event', 'Athlete ID', 'Athlete Name', 'Time', 
-                  'Age Group', 'Age Grade', 'Club']
-    
-    col_reorder = ['Event', 'Athlete ID', 'Athlete Name', 'Gender', 
-                   'Age Range', 'Age Group', 'Age Grade', 'Time', 'Club']
-    
-    df['Age Range'] = df['Age Group'].str.extract(r'(\d+-\d+|\d+)')
-    df['Gender']    = df['Age Group'].str.extract(r'([A-Z]{2})').apply(lambda x: x.str[-1])
-    
-    df['Gender'] = df['Gender'].replace('', 'Unknown')
+    '''
+    df = get_html_table(url, schema=['Event', 'Athlete ID', 'Athlete Name', 'Time', 
+                                     'Age Group', 'Age Grade', 'Club'])
 
-    df['Gender'] = np.where(df['Gender'] == 'M', 'Male', 'Female')
+    # Get gender and age range from age group, e.g. VM40-44
+    df[['Gender', 'Age Range']] = normalize.parse_age_groups(df['Age Group'])
 
-    df['Club'] = df['Club'].str.replace('Unattached', '')
+    df['Club'] = normalize.clean_clubs(df['Club'])
 
     # Reorder columns
-    df = df[col_reorder]
+    df = df[AGE_GRADE_COLS]
 
-    return df
+    return finish(df, typed, time_dtype)
 
-def get_course_records(url):
+COURSE_RECORDS_COLS = ['Event', 'Athlete ID', 'Athlete Name', 'Gender', 'Time', 'Date']
 
-    # 
-    # Getting data from url = https://www.parkrun.jp/results/courserecords
-    # process.py:139: SettingWithCopyWarning: 
-    # A value is trying to be set on a copy of a slice from a DataFrame.
-    # Try using .loc[row_indexer,col_indexer] = value instead
-    #
+@metrics.instrument('transform')
+def get_course_records(url, typed=False, time_dtype='seconds'):
 
     df = get_html_table(url)
 
-    # Split df into two
-    df1 = df.iloc[:, :5]
-    df2 = df.drop(df.columns[1:5], axis=1)
-
     columns = ['Event', 'Athlete ID', 'Athlete Name', 'Time', 'Date']
 
-    col_reorder = ['Event', 'Athlete ID', 'Athlete Name', 'Gender', 'Time', 'Date']
-
-    df1.columns = columns
-    df2.columns = columns
-    df1['Gender'] = np.where(df1['Athlete Name'] == '', 'Unknown', 'Female')
-    df2['Gender'] = np.where(df2['Athlete Name'] == '', 'Unknown', 'Male')
+    # Each row has the female then male record for an event
+    df = normalize.stack_pairs(df, columns, ('Female', 'Male'))
 
-    df = pd.concat([df1, df2])
+    df = df[COURSE_RECORDS_COLS]
+    return finish(df, typed, time_dtype)
 
-    df = df[col_reorder]
-    return df
+FREEDOM_COLS = ['Athlete ID', 'Athlete Name', 'Date', 'Location', 'Time']
 
-def get_freedom_finishers(url):
+@metrics.instrument('transform')
+def get_freedom_finishers(url, typed=False, time_dtype='seconds'):
     '''
     Deprecated for some countries, and may soon get deprecated for others 
 
     '''
 
-    df = get_html_table(url)
-    df.columns = ['Athlete ID', 'Athlete Name', 'Date', 'Location', 'Time']
+    df = get_html_table(url, schema=table_schema(FREEDOM_COLS, typed, time_dtype))
     return df
 
 
-def get_attendance_records(url):
-    df = get_html_table(url)
-    df.columns = ['Event', 'Record Attendance', 'Record Week', 'This Week']
+ATTENDANCE_COLS = ['Event', 'Record Attendance', 'Record Week', 'This Week']
+
+@metrics.instrument('transform')
+def get_attendance_records(url, typed=False, time_dtype='seconds'):
+    df = get_html_table(url, schema=ATTENDANCE_COLS)
 
     # Assign the no. athletes of 'Record Week' to 'This Week' if New record 
     # was set this week
     df.loc[df['This Week'].str.contains('New'), 'This Week'] = df['Record Attendance']
 
-    return df
+    return finish(df, typed, time_dtype)
+
+MOST_EVENTS_GLOBAL_COLS  = ['Athlete ID', 'Athlete Name', 'Parkrun Club',
+                            'No. Unique Events (Global)', 'Total Runs Worldwide']
+
+MOST_EVENTS_COUNTRY_COLS = ['Athlete ID', 'Athlete Name', 'Parkrun Club',
+                            'No. Unique Events (in Home Country)',
+                            'Total Parkruns (in Home Country)', 'Total Runs Worldwide']
 
-def get_most_events_attended(url):
+@metrics.instrument('transform')
+def get_most_events_attended(url, typed=False, time_dtype='seconds'):
     '''
     Current implementation does not include 'Home Country' of an Athlete, i.e.,
     where they initially signed up with Parkrun. 
@@ -185,72 +192,51 @@ def get_most_events_attended(url):
 
     '''
 
-    def assign_milestone(no_runs):
-        '''
-        This function assigns a milestone for based on number of runs done 
-        by a parkrunner.
-
-        Current no clubs assigned for less than 25 runners, and for runners 
-        who've ran more than 1000 parkruns. 
-
-        '''
-        if no_runs >= 25 and no_runs < 50:
-            return 25
-        elif no_runs >= 50 and no_runs < 100:
-            return 50
-        elif no_runs >= 100 and no_runs < 250:
-            return 100
-        elif no_runs >= 250 and no_runs < 500:
-            return 250
-        elif no_runs >= 500 and no_runs < 1000:
-            return 500
-        else:
-            return
-    
     df = get_html_table(url)
 
     #
     # For global results
     #
     if len(df.columns) == 5:
-        df.columns = ['Athlete ID', 'Athlete Name', 
-                      'Parkrun Club', 'No. Unique Events (Global)', 
-                      'Total Runs Worldwide']
+        df.columns = MOST_EVENTS_GLOBAL_COLS
     
     #
     # For country specific
     #
     if len(df.columns) == 6:
-        df.columns = ['Athlete ID', 'Athlete Name', 
-                      'Parkrun Club', 'No. Unique Events (in Home Country)', 
-                      'Total Parkruns (in Home Country)', 'Total Runs Worldwide']
+        df.columns = MOST_EVENTS_COUNTRY_COLS
 
     # # Convert 'Total Runs Worldwide' to int
     df['Total Runs Worldwide']   = df['Total Runs Worldwide'].astype(int)
 
-    # Assign milestones
-    df['Parkrun Club'] = df['Total Runs Worldwide'].apply(assign_milestone)
+    #
+    # Assign milestones. Currently no clubs assigned for less than 25 runs,
+    # and for runners who've ran more than 1000 parkruns (see normalize.py)
+    #
+    df['Parkrun Club'] = normalize.assign_milestones(df['Total Runs Worldwide'])
 
-    return df
+    return finish(df, typed, time_dtype)
 
-def get_most_first_finishes(url):
-    df = get_html_table(url)
-    df.columns = ['Athlete ID', 'Athlete Name', 'No. First Place Finishes']
+MOST_FIRST_COLS = ['Athlete ID', 'Athlete Name', 'No. First Place Finishes']
+
+@metrics.instrument('transform')
+def get_most_first_finishes(url, typed=False, time_dtype='seconds'):
+    df = get_html_table(url, schema=table_schema(MOST_FIRST_COLS, typed, time_dtype))
     return df
 
-def get_largest_clubs(url):
-    df = get_html_table(url)
-    
-    # Remove links column
-    df = df.drop(df.columns[3], axis=1)
+LARGEST_CLUBS_COLS = ['Club Name', 'No. Athletes', 'No. Runs']
 
-    # Assign column names
-    df.columns = ['Club Name', 'No. Athletes', 
-                    'No. Runs']
+@metrics.instrument('transform')
+def get_largest_clubs(url, typed=False, time_dtype='seconds'):
+
+    # Assign column names, leaving out the links column
+    df = get_html_table(url, schema=table_schema(LARGEST_CLUBS_COLS, typed, time_dtype),
+                        usecols=[0, 1, 2])
     return df
 
 
-def get_not_parkrunners(url):
+@metrics.instrument('transform')
+def get_not_parkrunners(url, typed=False, time_dtype='seconds'):
     '''
 
     !!! CURRENTLY DEPRECATED !!!
@@ -262,18 +248,60 @@ def get_not_parkrunners(url):
 
     '''
 
-    columns = ['Location', 'No. Athletes', 'Total No. Runs', 'Average Time']
-
-    df = get_html_table(url)
-
     #
-    # Remove all the country data extracted from 'Australia' onwards
+    # Stop reading at the country data, from 'Australia' onwards, whose row
+    # links to the marker page
     #
-    i = df[df.iloc[:,1] == 'https://www.parkrun.com.au/results/notparkrun'].index[0]
-    df = df.iloc[:i]
+    df = get_html_table(url, schema=table_schema(NOT_PARKRUN_COLS, typed, time_dtype),
+                        stop=is_not_parkrun_countries, links=True)
     # df = df.drop(df.columns[1], axis=1)
 
-    # Assign column names
-    df.columns = columns
+    return df
+
+
+EVENT_HISTORY_COLS = ['Event Number', 'Date', 'Finishers', 'Volunteers',
+                      'Male First Finisher ID', 'Male First Finisher',
+                      'Female First Finisher ID', 'Female First Finisher']
 
-    return df
\ No newline at end of file
+EVENT_RESULTS_COLS = ['Position', 'Athlete ID', 'Athlete Name', 'Gender',
+                      'Age Group', 'Club', 'Time']
+
+@metrics.instrument('transform')
+def get_event_history(url, typed=False, time_dtype='seconds'):
+    '''
+    Retrieves the history of a location, with one row per event held there,
+    e.g. https://www.parkrun.com.au/albertmelbourne/results/eventhistory/
+
+    'Event Number' is always an integer, as it's used to find new events.
+
+    '''
+    df = get_html_table(url, schema=table_schema(EVENT_HISTORY_COLS, typed, time_dtype))
+
+    df['Event Number'] = schema.convert(df['Event Number'], 'int')
+
+    return df
+
+@metrics.instrument('transform')
+def get_event_results(url, typed=False, time_dtype='seconds'):
+    '''
+    Retrieves the results of a single event at a location, e.g.
+    https://www.parkrun.com.au/albertmelbourne/results/latestresults/ or
+    https://www.parkrun.com.au/albertmelbourne/results/250/
+
+    '''
+    df = get_html_table(url, schema=EVENT_RESULTS_COLS)
+
+    df['Club'] = normalize.clean_clubs(df['Club'])
+
+    return finish(df, typed, time_dtype)
+
+
+@metrics.instrument('transform')
+def get_raw_table(url, typed=False, time_dtype='seconds'):
+    '''
+    Retrieves a page which has no transform yet (e.g. a location's club
+    list) as an untransformed table, with numbered text columns. typed and
+    time_dtype are accepted so it can be run like any other report.
+
+    '''
+    return get_html_table(url)
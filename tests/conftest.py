@@ -0,0 +1,9 @@
+import os
+import sys
+
+#
+# Tests import the package's modules (refactor/) and the benchmark fixtures
+# (benchmarks/) as top-level modules, as the benchmarks do.
+#
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path[:0] = [os.path.join(ROOT, 'refactor'), os.path.join(ROOT, 'benchmarks')]
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import delta
+
+
+def test_nullable_and_numpy_ints_are_unchanged():
+    old = pd.DataFrame({'Athlete ID': [1, 2, 3], 'Events': [10, 20, 30]})
+    new = old.astype({'Events': 'Int64'})
+    assert delta.diff(old, new, 'Athlete ID').empty
+
+
+def test_missing_values_compare_equal_across_dtypes():
+    old = pd.DataFrame({'Athlete ID': [1, 2], 'Events': [10.0, None]})
+    new = pd.DataFrame({'Athlete ID': [1, 2], 'Events': pd.array([10, None], dtype='Int64')})
+    assert delta.diff(old, new, 'Athlete ID').empty
+
+
+def test_category_and_text_values_are_unchanged():
+    old = pd.DataFrame({'Event': ['a', 'b'], 'Gender': ['Male', 'Female']})
+    new = old.astype({'Gender': 'category'})
+    assert delta.diff(old, new, 'Event').empty
+
+
+def test_text_keys_join_typed_keys():
+    old = pd.DataFrame({'Athlete ID': ['1', '2'], 'Name': ['x', 'y']})
+    new = pd.DataFrame({'Athlete ID': [1, 2], 'Name': ['x', 'z']})
+    result = delta.diff(old, new, 'Athlete ID')
+    assert (len(result.inserted), len(result.removed), len(result.changed)) == (0, 0, 1)
+
+
+def test_typed_against_untyped_values_raises():
+    old = pd.DataFrame({'Event': ['a'], 'Time': ['17:01']})
+    new = pd.DataFrame({'Event': ['a'], 'Time': pd.to_timedelta(['00:17:01'])})
+    with pytest.raises(ValueError, match='Time'):
+        delta.diff(old, new, 'Event')
@@ -0,0 +1,30 @@
+import csv
+import json
+
+import pandas as pd
+import pytest
+
+import export
+
+PAGES = [pd.DataFrame({'Event': ['a', 'b'], 'Athletes': [1, 2]}),
+         pd.DataFrame({'Event': ['c'], 'Athletes': [3]})]
+
+
+def read_back(path, format):
+    with open(path, encoding='utf-8', newline='') as f:
+        if format == 'csv':
+            return [dict(row) for row in csv.DictReader(f)]
+        if format == 'ndjson':
+            return [json.loads(line) for line in f.read().split('\n')[:-1]]
+    return pd.read_parquet(path).to_dict('records')
+
+
+@pytest.mark.parametrize('format', list(export.WRITERS))
+def test_pages_read_back_line_by_line(tmp_path, format):
+    with export.Exporter(str(tmp_path), format) as exporter:
+        for df in PAGES:
+            exporter.write('largest_clubs', df.copy(), {'Country': 'Australia'})
+
+    rows = read_back(exporter.path('largest_clubs'), format)
+    assert [(row['Country'], row['Event'], int(row['Athletes'])) for row in rows] == \
+           [('Australia', 'a', 1), ('Australia', 'b', 2), ('Australia', 'c', 3)]
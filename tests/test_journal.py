@@ -0,0 +1,22 @@
+import os
+
+import journal
+
+
+def test_output_path_nests_labels():
+    path = journal.output_path('event_results', {'Country'      : 'Australia',
+                                                 'Location'     : 'Albert Melbourne',
+                                                 'Event Number' : 12})
+    assert path == os.path.join('event_results', 'Australia', 'Albert%20Melbourne', '12.parquet')
+
+
+def test_output_path_distinct_for_labels_with_underscores():
+    # Joining labels with '_' made these the same file
+    first  = journal.output_path('event_results', {'Location': 'a_b', 'Event Number': 'c'})
+    second = journal.output_path('event_results', {'Location': 'a', 'Event Number': 'b_c'})
+    assert first != second
+
+
+def test_output_path_without_labels():
+    assert journal.output_path('course_records', {}) == \
+           os.path.join('course_records', 'course_records.parquet')
@@ -0,0 +1,41 @@
+import pytest
+
+import fixtures
+import scrape
+import transform
+
+URL = 'https://www.parkrun.com.au/results/notparkrun'
+
+
+@pytest.fixture
+def page():
+    # 20 locations, then the country section (see fixtures.not_parkrun_countries)
+    html = fixtures.page('not_parkrunners', 20)
+    with scrape.preloaded({URL: (html.encode('utf-8'), 'utf-8')}):
+        yield
+
+
+@pytest.mark.parametrize('parser', list(scrape.PARSERS))
+def test_stops_at_country_section(page, parser):
+    previous = scrape._parser
+    scrape.set_parser(parser)
+    try:
+        df = transform.get_not_parkrunners(URL)
+    finally:
+        scrape.set_parser(previous)
+
+    assert len(df) == 20
+    assert list(df.columns) == transform.NOT_PARKRUN_COLS
+    assert not df['Location'].isin(fixtures.COUNTRIES).any()
+
+
+def test_typed(page):
+    df = transform.get_not_parkrunners(URL, typed=True)
+    assert len(df) == 20
+
+
+def test_marker_needs_link():
+    row = scrape.TableRow(['Australia', '1000'], ['https://www.parkrun.com.au/results/notparkrun/'])
+    assert transform.is_not_parkrun_countries(row)
+    assert not transform.is_not_parkrun_countries(scrape.TableRow(['Australia', '1000']))
+    assert not transform.is_not_parkrun_countries(scrape.TableRow(['Other countries'], row.links))
@@ -0,0 +1,14 @@
+import pytest
+
+import fixtures
+import registry
+import scrape
+
+
+@pytest.mark.parametrize('name', [name for name in fixtures.ROWS
+                                  if name in registry.names(registry.GLOBAL)])
+def test_transform_returns_registered_columns(name):
+    url = registry.url_for(name)
+    with scrape.preloaded({url: (fixtures.page(name, 20).encode('utf-8'), 'utf-8')}):
+        df = registry.run(name)
+    assert list(df.columns) == registry.columns_for(name)
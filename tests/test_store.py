@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+
+import store
+
+
+def files(root):
+    return sorted(os.path.relpath(os.path.join(directory, name), root)
+                  for directory, _, names in os.walk(root)
+                  for name in names if name.endswith('.parquet'))
+
+
+def test_replacing_a_snapshot_removes_its_file(tmp_path):
+    results = store.ResultStore(str(tmp_path))
+    first   = results.append('course_records', pd.DataFrame({'a': [1]}), snapshot_date='2026-09-05')
+    second  = results.append('course_records', pd.DataFrame({'a': [2]}), snapshot_date='2026-09-05')
+
+    assert files(str(tmp_path)) == [second.path]
+    assert not os.path.exists(os.path.join(str(tmp_path), first.path))
+    assert results.latest('course_records')['a'].tolist() == [2]
+
+
+def test_replacing_a_snapshot_keeps_a_shared_file(tmp_path):
+    results = store.ResultStore(str(tmp_path))
+    first   = results.append('course_records', pd.DataFrame({'a': [1]}), snapshot_date='2026-09-05')
+    results.append('course_records', pd.DataFrame({'a': [1]}), snapshot_date='2026-09-12')
+    results.append('course_records', pd.DataFrame({'a': [2]}), snapshot_date='2026-09-05')
+
+    # The 12th still refers to the file first written on the 5th
+    assert os.path.exists(os.path.join(str(tmp_path), first.path))
+    assert len(files(str(tmp_path))) == 2